@@ -1,3 +1,3 @@
-from langconv import converter, language, trie
+from langconv import cache, converter, group, language, stats, trie
 
-__all__ = ['converter', 'language', 'trie']
+__all__ = ['cache', 'converter', 'group', 'language', 'stats', 'trie']
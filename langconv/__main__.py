@@ -0,0 +1,5 @@
+import sys
+
+from langconv.cli import main
+
+sys.exit(main())
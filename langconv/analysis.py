@@ -0,0 +1,152 @@
+"""Diagnostics of conversion tables, and pruning of the keys they do not need::
+
+    python -m langconv.analysis zh-tw             # Reports on the tables of zh-tw
+    python -m langconv.analysis -o pruned/ zh-tw  # Also writes the pruned table to pruned/zh-tw.json
+
+Keys are matched leftmost-longest, so many keys of the tables are there to keep shorter keys from
+matching, some as identity mappings like ``"下著作": "下著作"``. Others convert to what their
+parts would convert to anyway, and removing them changes no output; see :func:`prune_table`.
+"""
+
+import argparse
+import importlib
+import json
+import os
+from collections import Counter
+from collections.abc import Mapping, Sequence
+
+from attrs import define, evolve
+
+from langconv.language import Language
+from langconv.trie import Trie
+
+
+@define(frozen=True)
+class TableReport:
+    """A report on a conversion table made of layers, such as the JSON files of a language."""
+
+    keys: int
+    """The number of keys of the table."""
+    max_length: int
+    """The length of the longest key."""
+    identity: tuple[str, ...]
+    """Keys mapped to themselves. Longer keys like these only keep shorter keys from matching."""
+    shadowed: tuple[str, ...]
+    """Keys of a layer overridden by an upper layer with a different value."""
+    duplicate: tuple[str, ...]
+    """Keys of a layer overridden by an upper layer with the same value."""
+    redundant: tuple[str, ...]
+    """Keys that can be removed without changing the output. See :func:`prune_table`."""
+
+    def format(self) -> str:
+        """Formats the report as a summary of each category."""
+        identity = set(self.identity)
+        return '\n'.join(
+            [
+                f'keys: {self.keys}, longest: {self.max_length}',
+                f'identity: {len(self.identity)}',
+                f'shadowed: {len(self.shadowed)}',
+                f'duplicate: {len(self.duplicate)}',
+                f'redundant: {len(self.redundant)} '
+                f'({sum(key in identity for key in self.redundant)} identity)',
+            ]
+        )
+
+
+def analyze_table(layers: Sequence[Mapping[str, str]]) -> TableReport:
+    """Reports on the table made of ``layers``, from lowest to highest precedence."""
+    table: dict[str, str] = {}
+    shadowed: list[str] = []
+    duplicate: list[str] = []
+    for layer in layers:
+        for key, value in layer.items():
+            if key in table:
+                (duplicate if table[key] == value else shadowed).append(key)
+            table[key] = value
+    table = {key: value for key, value in table.items() if key and value}
+    pruned = prune_table(table)
+    return TableReport(
+        len(table),
+        max(map(len, table), default=0),
+        tuple(key for key, value in table.items() if key == value),
+        tuple(shadowed),
+        tuple(duplicate),
+        tuple(key for key in table if key not in pruned),
+    )
+
+
+def analyze_language(language: Language) -> TableReport:
+    """Reports on the table of ``language``."""
+    return analyze_table([language.rules.compile().table])
+
+
+def prune_table(table: Mapping[str, str]) -> dict[str, str]:
+    """Removes the keys of ``table`` that do not change the output of conversion.
+
+    A key can be removed if the text of the key converts to its value without it, and no other key
+    can match from inside the key past its end, so that conversion resumes after the key as it
+    would with it. Longer keys are removed first, and each key is checked against the keys left.
+
+    The output is only unchanged with the table alone: rules layered on top of it, such as the
+    rules of a document, may match across the end of a removed key.
+    """
+    table = {key: value for key, value in table.items() if key and value}
+    max_length = max(map(len, table), default=0)
+    # The proper prefixes of the keys, which can match past the end of a text
+    prefixes = Counter(key[:i] for key in table for i in range(1, len(key)))
+    for key in sorted(table, key=len, reverse=True):
+        value = table.pop(key)
+        prefixes.subtract(key[:i] for i in range(1, len(key)))
+        if _convert_alone(key, table, prefixes, max_length) != value:
+            table[key] = value
+            prefixes.update(key[:i] for i in range(1, len(key)))
+    return table
+
+
+def prune_language(language: Language) -> Language:
+    """Returns ``language`` with a pruned table. See :func:`prune_table`."""
+    return evolve(language, rules=Trie.from_dict(prune_table(language.rules.compile().table)))
+
+
+def _convert_alone(
+    text: str, table: dict[str, str], prefixes: Counter[str], max_length: int
+) -> str | None:
+    """Converts ``text`` with ``table`` leftmost-longest, or returns None if a key can match from
+    inside the text past its end."""
+    output: list[str] = []
+    i = 0
+    while i < len(text):
+        if i and prefixes[text[i:]] > 0:
+            return None
+        for length in range(min(max_length, len(text) - i), 0, -1):
+            value = table.get(text[i : i + length])
+            if value:
+                break
+        else:
+            value, length = text[i], 1
+        output.append(value)
+        i += length
+    return ''.join(output)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m langconv.analysis', description='Reports on conversion tables.'
+    )
+    parser.add_argument('codes', nargs='*', metavar='CODE', help='the variants, e.g. zh-tw')
+    parser.add_argument('-o', '--output', help='the directory to write the pruned tables to')
+    args = parser.parse_args(argv)
+    for code in args.codes or ['zh-cn', 'zh-hk', 'zh-tw']:
+        module = importlib.import_module(f'langconv.language.{code.split("-")[0]}')
+        layers = module.load_layers(code)
+        print(f'{code}:\n{analyze_table(layers).format()}\n')
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            merged = {key: value for layer in layers for key, value in layer.items()}
+            with open(os.path.join(args.output, f'{code}.json'), 'w', encoding='utf-8') as f:
+                json.dump(prune_table(merged), f, ensure_ascii=False, indent=2)
+                f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+
+from attrs import define, field
+
+
+@define
+class ConversionCache:
+    """A bounded LRU cache of conversion results, used by :class:`~langconv.converter.LanguageConverter`.
+
+    Conversion is a pure function of the text, the conversion options and the conversion tables,
+    so results are keyed on the variant, the text and options, and the results of a variant are
+    dropped whenever its tables change (see :meth:`validate`). Per-document rules (``-{H|...}-``
+    etc.) are part of the text, so texts using them are cached correctly as well. A cache can be
+    shared by converters to different variants.
+    """
+
+    maxsize: int = 4096
+    """The maximum number of entries."""
+
+    maxbytes: int = 64 << 20
+    """The maximum total size of cached texts and results, in bytes."""
+
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    evictions: int = field(default=0, init=False)
+    currbytes: int = field(default=0, init=False)
+
+    _entries: 'OrderedDict[tuple[Hashable, Hashable], tuple[str, int]]' = field(
+        factory=OrderedDict[tuple[Hashable, Hashable], tuple[str, int]], init=False, repr=False
+    )
+    _stamps: dict[Hashable, tuple[object, ...]] = field(
+        factory=dict[Hashable, tuple[object, ...]], init=False, repr=False
+    )
+    _lock: threading.Lock = field(factory=threading.Lock, init=False, repr=False, eq=False)
+
+    def get(self, key: Hashable, variant: Hashable = None) -> str | None:
+        """Gets the cached result for ``key`` of ``variant``, marking it as recently used."""
+        with self._lock:
+            entry = self._entries.get((variant, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((variant, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(  # noqa: PLR0913
+        self,
+        key: Hashable,
+        text: str,
+        result: str,
+        variant: Hashable = None,
+        stamp: tuple[object, ...] | None = None,
+    ) -> None:
+        """Caches ``result`` as the conversion of ``text`` under ``key`` of ``variant``, evicting the
+        least recently used entries if needed. Results too large for the cache are not cached.
+
+        ``stamp`` is the stamp passed to :meth:`validate` before the conversion. If the tables of
+        ``variant`` were validated with another stamp since, the result is not cached.
+        """
+        size = sys.getsizeof(text) + sys.getsizeof(result)
+        if size > self.maxbytes:
+            return
+        with self._lock:
+            if stamp is not None and not same_objects(stamp, self._stamps.get(variant, ())):
+                return
+            old = self._entries.pop((variant, key), None)
+            if old is not None:
+                self.currbytes -= old[1]
+            self._entries[variant, key] = (result, size)
+            self.currbytes += size
+            while len(self._entries) > self.maxsize or self.currbytes > self.maxbytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.currbytes -= evicted
+                self.evictions += 1
+
+    def validate(self, stamp: tuple[object, ...], variant: Hashable = None) -> None:
+        """Drops the results of ``variant`` if ``stamp``, the tables results depend on, is not the
+        one the cached results were computed with. Tables are compared by identity."""
+        if same_objects(stamp, self._stamps.get(variant, ())):
+            return
+        with self._lock:
+            for entry in [entry for entry in self._entries if entry[0] == variant]:
+                self.currbytes -= self._entries.pop(entry)[1]
+            self._stamps[variant] = stamp
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._stamps.clear()
+            self.currbytes = self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __reduce__(self) -> tuple[type['ConversionCache'], tuple[int, int]]:
+        # Copies (e.g. in worker processes) start empty
+        return type(self), (self.maxsize, self.maxbytes)
+
+
+def same_objects(a: Sequence[object], b: Sequence[object]) -> bool:
+    """Whether ``a`` and ``b`` hold the same objects, compared by identity, in the same order."""
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b, strict=True))
@@ -0,0 +1,237 @@
+"""Command-line interface, installed as ``langconv`` (or run with ``python -m langconv``)::
+
+    langconv --to zh-tw input.txt > output.txt
+    langconv --to zh-cn --html -o converted/ pages/   # Mirrors the directory tree
+    cat input.txt | langconv --to zh-hk
+
+Files are streamed in bounded memory, and several files are converted in parallel by a pool of
+worker processes. Output files are written atomically. Global rules (``-{H|...}-``) apply from
+where they appear.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from typing import TextIO
+
+from attrs import define
+
+from langconv.converter import LanguageConverter
+from langconv.language import get_language
+
+CHUNK_SIZE = 1 << 16
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Runs the command line interface with ``argv`` (defaults to ``sys.argv[1:]``).
+
+    :returns: The exit status: 0 on success, 1 if any input could not be converted.
+    """
+    parser = _create_parser()
+    args = parser.parse_args(argv)
+    try:
+        language = get_language(args.to)
+    except LookupError as e:
+        parser.error(str(e))
+    options = {'markup': args.markup, 'avoid_html_code': args.html}
+    inputs: list[str] = args.inputs or ['-']
+    if '-' in inputs and len(inputs) > 1:
+        parser.error('standard input cannot be converted together with files')
+    if args.in_place and (args.output or inputs == ['-']):
+        parser.error('--in-place cannot be used with --output or standard input')
+
+    for stream in (sys.stdin, sys.stdout):
+        if isinstance(stream, io.TextIOWrapper):
+            stream.reconfigure(encoding='utf-8', newline='')
+
+    started = time.perf_counter()
+    if inputs == ['-']:
+        converter = LanguageConverter.from_language(language)
+        files = [_convert_path(converter, '-', args.output, options)]
+    else:
+        try:
+            jobs = list(_find_jobs(inputs, args.output, in_place=args.in_place))
+        except OSError as e:
+            parser.error(str(e))
+        files = _convert_files(language.code, jobs, options, args.jobs)
+    return _report(files, time.perf_counter() - started, quiet=args.quiet)
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='langconv', description='Converts text between Chinese variants.'
+    )
+    parser.add_argument(
+        'inputs',
+        nargs='*',
+        metavar='INPUT',
+        help='files or directories to convert, or - for standard input (the default)',
+    )
+    parser.add_argument('-t', '--to', required=True, help='the variant to convert to, e.g. zh-tw')
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='the output file, or the output directory if there are several inputs or a '
+        'directory. Defaults to standard output',
+    )
+    parser.add_argument(
+        '-i', '--in-place', action='store_true', help='overwrite the input files with the output'
+    )
+    parser.add_argument(
+        '--html',
+        action='store_true',
+        help='convert HTML, leaving tags, comments, scripts, styles and code as is',
+    )
+    parser.add_argument(
+        '--no-markup',
+        dest='markup',
+        action='store_false',
+        help='convert conversion syntax (-{ ... }-) as plain text',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='the number of worker processes for several files. Defaults to the number of CPUs',
+    )
+    parser.add_argument(
+        '-q', '--quiet', action='store_true', help='do not report the throughput when done'
+    )
+    return parser
+
+
+def _report(files: list[tuple[int, str | None]], elapsed: float, *, quiet: bool) -> int:
+    """Reports the errors of the converted ``files`` and the throughput, returning the exit
+    status."""
+    size, failed = 0, 0
+    for result, error in files:
+        size += result
+        if error is not None:
+            failed += 1
+            print(f'langconv: {error}', file=sys.stderr)
+    if not quiet:
+        mb = size / 1e6
+        print(
+            f'langconv: {len(files) - failed} file(s), {mb:.2f} MB in {elapsed:.2f} s '
+            f'({mb / elapsed if elapsed else 0:.2f} MB/s)',
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
+
+
+def _find_jobs(
+    inputs: list[str], output: str | None, *, in_place: bool
+) -> Iterator[tuple[str, str | None]]:
+    """Finds the files to convert and where to write them (None for standard output)."""
+    into_directory = output is not None and (
+        len(inputs) > 1 or os.path.isdir(inputs[0]) or os.path.isdir(output)
+    )
+    for path in inputs:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'No such file or directory: {path!r}')
+        if not os.path.isdir(path):
+            name = os.path.basename(path)
+            yield path, path if in_place else _destination(output, into_directory, name)
+            continue
+        for directory, _, files in sorted(os.walk(path)):
+            for file in sorted(files):
+                source = os.path.join(directory, file)
+                name = os.path.relpath(source, path)
+                yield source, source if in_place else _destination(output, into_directory, name)
+
+
+def _destination(output: str | None, into_directory: bool, name: str) -> str | None:
+    if output is None:
+        return None
+    return os.path.join(output, name) if into_directory else output
+
+
+def _convert_files(
+    code: str, jobs: list[tuple[str, str | None]], options: dict[str, bool], workers: int | None
+) -> list[tuple[int, str | None]]:
+    # Output to standard output is written in order by this process
+    if workers == 1 or len(jobs) <= 1 or any(destination is None for _, destination in jobs):
+        converter = LanguageConverter.from_language(get_language(code))
+        return [_convert_path(converter, source, dest, options) for source, dest in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(code,)) as executor:
+        sources, destinations = zip(*jobs, strict=True)
+        return list(executor.map(_convert_in_worker, sources, destinations, [options] * len(jobs)))
+
+
+def _convert_path(
+    converter: LanguageConverter, source: str, destination: str | None, options: dict[str, bool]
+) -> tuple[int, str | None]:
+    try:
+        if source == '-':
+            return _convert_to(converter, sys.stdin, destination, options), None
+        with open(source, encoding='utf-8', newline='') as reader:
+            return _convert_to(converter, reader, destination, options), None
+    except (OSError, ValueError) as e:  # ValueError includes UnicodeDecodeError
+        return 0, f'{source}: {e}'
+
+
+def _convert_to(
+    converter: LanguageConverter,
+    reader: TextIO,
+    destination: str | None,
+    options: dict[str, bool],
+) -> int:
+    if destination is None:
+        return _convert_stream(converter, reader, sys.stdout, options)
+    # Written to a temporary file first, so that the destination is never left half-written
+    directory = os.path.dirname(destination)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f'{destination}.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='') as writer:
+            size = _convert_stream(converter, reader, writer, options)
+        os.replace(tmp, destination)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return size
+
+
+def _convert_stream(
+    converter: LanguageConverter, reader: TextIO, writer: TextIO, options: dict[str, bool]
+) -> int:
+    """Converts ``reader`` to ``writer``, returning the size of the input in UTF-8 bytes."""
+    counter = _CountingReader(reader)
+    converter.convert_stream(counter, writer, CHUNK_SIZE, **options)
+    writer.flush()
+    return counter.size
+
+
+@define
+class _CountingReader:
+    reader: TextIO
+    size: int = 0
+
+    def read(self, size: int = -1) -> str:
+        chunk = self.reader.read(size)
+        self.size += len(chunk.encode('utf-8', 'surrogatepass'))
+        return chunk
+
+
+_worker_converter: LanguageConverter | None = None
+
+
+def _init_worker(code: str) -> None:
+    # Workers load the tables themselves, which is faster than receiving them from the parent
+    global _worker_converter  # noqa: PLW0603
+    _worker_converter = LanguageConverter.from_language(get_language(code))
+
+
+def _convert_in_worker(
+    source: str, destination: str | None, options: dict[str, bool]
+) -> tuple[int, str | None]:
+    assert _worker_converter is not None
+    return _convert_path(_worker_converter, source, destination, options)
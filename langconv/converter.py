@@ -1,14 +1,115 @@
+import contextlib
+import hashlib
 import re
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import Executor
 from enum import Enum
+from functools import cache, partial
+from itertools import islice, repeat
+from typing import TYPE_CHECKING, Any
+from weakref import WeakKeyDictionary
 
-from attrs import define
+from attrs import Factory, define, field
 
+from langconv.cache import ConversionCache, same_objects
 from langconv.language import Language
-from langconv.trie import Node, Trie
+from langconv.stats import ConversionStats
+from langconv.trie import CharTable, CompiledTrie, LayeredTrie, Node, RuleLayer, Trie
+
+if TYPE_CHECKING:
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    from _typeshed import SupportsRead, SupportsWrite
+
+    from langconv.group import ConversionGroup
 
 SECTION_LENGTH = 30 - 1
 # We assume that the longest match will be 30 characters long to save mem
 
+MAX_HELD_MARKUP = 1 << 20
+# `iter_convert` holds back the text of a block not closed yet up to this many characters, after
+# which it is not a block, like one left unclosed at the end of a line
+
+TRANSLATE_THRESHOLD = 8
+# Texts at least this long are converted with `str.translate` between the positions where a longer
+# key can start (see `CharTable`), which has a fixed cost
+
+MAX_DIVERGENCE = 0.5
+# Languages are converted in pairs by `convert_multi` if at most this fraction of their keys are
+# mapped differently
+
+RAW_TEXT_ELEMENTS = ('pre', 'code', 'script', 'style')
+# HTML elements whose content is not converted with `avoid_html_code`
+
+_TAG_START = re.compile(r'<[a-zA-Z/!?]')
+_TAG_NAME = re.compile(r'</?([a-zA-Z][a-zA-Z0-9]*)')
+_ATTRIBUTE_VALUE = re.compile(r"""\s*("[^"]*"?|'[^']*'?)?""")
+_TAG_CODE = re.compile(r""">|=\s*("[^"]*"?|'[^']*'?)?""")
+_TAG_STATES = ('>', '=', '"', "'")
+# What `DocumentState.html` starts with in a tag, see `_skip_tag`
+
+INLINE_THRESHOLD = 1000
+# Texts shorter than this are converted in the event loop by `aconvert`, as it takes less time
+# than handing them over to an executor
+
+
+def find_markup(text: str, start: int = 0, *, final: bool = False) -> tuple[int, int]:
+    """Finds the next markup block (``-{ ... }-``) in ``text`` at or after ``start``.
+
+    Blocks can be nested, and a block ends at the ``}-`` closing it. A block cannot span lines.
+
+    :param final: Whether ``text`` is complete. A block left unclosed at its end is then not a
+        block, like one left unclosed at the end of a line, and the blocks inside it are found.
+    :returns: The start and end of the outermost block. If a block starts but is not closed yet
+        (and ``final`` is false), the end is -1. If there is no block, both are -1.
+    """
+    while True:
+        begin = text.find('-{', start)
+        if begin == -1:
+            return -1, -1
+        depth, position = 1, begin + 2
+        while True:
+            close = text.find('}-', position)
+            if text.find('\n', position, len(text) if close == -1 else close) != -1:
+                break
+            if close == -1:
+                if final:
+                    break
+                return begin, -1
+            nested = text.find('-{', position, close)
+            if nested == -1:
+                depth -= 1
+                position = close + 2
+                if not depth:
+                    return begin, position
+            else:
+                depth += 1
+                position = nested + 2
+        start = begin + 1
+
+
+def _split_outside_markup(text: str, separator: str, maxsplit: int = -1) -> list[str]:
+    """Splits ``text`` like :meth:`str.split`, except inside nested markup blocks."""
+    pieces: list[str] = []
+    start = position = 0
+    while maxsplit:
+        found = text.find(separator, position)
+        nested = text.find('-{', position, len(text) if found == -1 else found)
+        if nested != -1:
+            begin, end = find_markup(text, nested)
+            position = end if begin == nested and end != -1 else nested + 2
+            continue
+        if found == -1:
+            break
+        pieces.append(text[start:found])
+        start = position = found + len(separator)
+        maxsplit -= 1
+    pieces.append(text[start:])
+    return pieces
+
 
 @define
 class LCMarkup:
@@ -37,6 +138,9 @@ class LCMarkup:
         EMPTY = ''
         """(Real) empty flag."""
 
+        GROUP = 'G'
+        """Use conversion groups, separated by semicolons. See :class:`~langconv.group.ConversionGroup`."""
+
     @define
     class Rule:
         pass
@@ -48,7 +152,7 @@ class LCMarkup:
 
         def localize(self, language: Language) -> tuple[dict[str, str], str] | None:
             fallbacks = language.fallbacks
-            for fallback in fallbacks + [language.code]:
+            for fallback in (*fallbacks, language.code):
                 match = self.mapping.get(fallback, None)
                 if match:
                     return {self.original: match}, match
@@ -62,7 +166,7 @@ class LCMarkup:
             fallbacks = language.fallbacks
             copy = self.mapping.copy()
             match: str | None = None
-            for fallback in fallbacks + [language.code]:
+            for fallback in (*fallbacks, language.code):
                 match = self.mapping.get(fallback, None)
                 if match:
                     copy.pop(fallback, None)
@@ -85,48 +189,46 @@ class LCMarkup:
 
     @classmethod
     def parse_rules(cls, raw: str):
-        from_to = [x.strip() for x in raw.split('=>', 1)]
+        # Separators in nested markup are skipped, which is only needed (and slower) if there is any
+        split = _split_outside_markup if '-{' in raw else str.split
+        from_to = [x.strip() for x in split(raw, '=>', 1)]
         # 1. Determine direction
         if len(from_to) == 1:
-            if from_to[0].find(':') == -1:
+            if len(split(from_to[0], ':', 1)) == 1:
                 # No rules. Raw or empty
                 return cls.Raw(original=from_to[0]) if from_to[0] else cls.Empty()
             # Omnidirectional rule
-            raw_rules = [x.strip() for x in from_to[0].split(';')]
-            rules: list[tuple[str, str]] = []
-            for rule in raw_rules:
-                splitted = rule.split(':', 1)
-                if len(splitted) != 2:  # noqa: PLR2004
-                    continue
-                rules.append((splitted[0].strip().lower(), splitted[1].strip()))
-            mapping = dict(rules)
-            return cls.Omnidirectional(mapping=mapping)
-        else:
-            # Unidirectional rule
-            original = from_to[0].strip()
-            raw_rules = [x.strip() for x in from_to[1].split(';')]
-            rules: list[tuple[str, str]] = []
-            for rule in raw_rules:
-                splitted = rule.split(':', 1)
-                if len(splitted) != 2:  # noqa: PLR2004
-                    continue
-                rules.append((splitted[0].strip().lower(), splitted[1].strip()))
-            mapping = dict(rules)
-            return cls.Unidirectional(original=original, mapping=mapping)
+            return cls.Omnidirectional(mapping=cls._parse_mapping(from_to[0], split))
+        # Unidirectional rule
+        return cls.Unidirectional(
+            original=from_to[0], mapping=cls._parse_mapping(from_to[1], split)
+        )
+
+    @staticmethod
+    def _parse_mapping(raw: str, split: Callable[[str, str, int], list[str]]) -> dict[str, str]:
+        mapping: dict[str, str] = {}
+        for rule in split(raw, ';', -1):
+            splitted = split(rule, ':', 1)
+            if len(splitted) == 2:  # noqa: PLR2004
+                mapping[splitted[0].strip().lower()] = splitted[1].strip()
+        return mapping
 
     @classmethod
-    def parse(cls, text: str) -> 'LCMarkup':
+    def parse(cls, text: str, start: int = 0, end: int | None = None) -> 'LCMarkup':
+        """Parses the markup block in ``text[start:end]``, as found by :func:`find_markup`."""
         # 1. Get rid of -{ and }-
-        text = text[2:-2].strip()
+        text = text[start + 2 : (len(text) if end is None else end) - 2].strip()
         # 2. Split flag and rules. Note that flag can be empty.
-        if text.find('|') != -1:
-            # If it has flag
-            raw_flag, raw_rules = (x.strip() for x in text.split('|', 1))
-            flag = cls.Flag(raw_flag)
-            rules = cls.parse_rules(raw_rules)
-        else:
-            raw_rules = text.strip()
-            rules = cls.parse_rules(raw_rules)
+        split = _split_outside_markup if '-{' in text else str.split
+        flag_rules = split(text, '|', 1)
+        flag = None
+        if len(flag_rules) == 2:  # noqa: PLR2004
+            # If it has flag. Unknown flags are dropped like in MediaWiki, keeping the rules
+            with contextlib.suppress(ValueError):
+                flag = cls.Flag(flag_rules[0].strip())
+            text = flag_rules[1]
+        rules = cls.parse_rules(text)
+        if flag is None:
             # If we find no flag, it can be RAW, SHOW or EMPTY
             if isinstance(rules, cls.Raw):
                 flag = cls.Flag.RAW
@@ -140,8 +242,42 @@ class LCMarkup:
 
 @define
 class LanguageConverter:
+    """Converts text to a language.
+
+    A converter can be shared by any number of threads. Conversion only reads the converter and
+    its tables, which are immutable once compiled, and keeps the rules defined by a document in
+    a :class:`DocumentState` of its own. Each conversion uses the tables of :attr:`rules` as they
+    were when it started, even if they are modified meanwhile.
+    """
+
     language: Language
     rules: list[Trie]
+    """Conversion rules, from highest to lowest precedence."""
+    cache: ConversionCache | None = field(default=None, kw_only=True)
+    """If set, conversion results are cached. See :class:`~langconv.cache.ConversionCache`."""
+    groups: 'dict[str, ConversionGroup]' = field(factory=dict[str, 'ConversionGroup'], kw_only=True)
+    """Conversion groups that documents can use with ``-{G|name}-``, by name."""
+    stats: ConversionStats | None = field(default=None, kw_only=True)
+    """
+    If set, statistics of conversions are collected. See :class:`~langconv.stats.ConversionStats`.
+    Results taken from :attr:`cache` are not recorded.
+    """
+    _table: tuple[list[CompiledTrie], LayeredTrie] | None = field(
+        default=None, init=False, repr=False, eq=False
+    )
+    _divergences: 'dict[int, tuple[LayeredTrie, LayeredTrie, _Divergence]]' = field(
+        factory=dict[int, 'tuple[LayeredTrie, LayeredTrie, _Divergence]'],
+        init=False,
+        repr=False,
+        eq=False,
+    )
+
+    def match(self, text: str, start: int = 0) -> tuple[int, str] | None:
+        """Finds the key of :attr:`rules` that :meth:`convert` matches at ``text[start:]``.
+
+        :returns: The length of the key and its value, or None if no key matches.
+        """
+        return self.get_table().match(text, start, start + SECTION_LENGTH)
 
     def longest_prefix(self, text: str, extra_rules: list[Trie] | None = None) -> Node | None:
         rules = self.rules if extra_rules is None else extra_rules + self.rules
@@ -151,110 +287,1034 @@ class LanguageConverter:
                 return match
         return None
 
+    def convert_text(  # noqa: PLR0913
+        self,
+        text: str,
+        table: LayeredTrie,
+        output: list[str],
+        start: int = 0,
+        *,
+        stop: int | None = None,
+        end: int | None = None,
+    ) -> int:
+        """Converts plain text (without markup) with the given table, appending to ``output``.
+
+        This is the hot loop of :meth:`convert`, so the lookups are inlined. Long texts are
+        converted with :meth:`str.translate` where possible, see :meth:`translate_text`.
+
+        :param start: The position to start converting at.
+        :param stop: Conversion stops at the first position at or after ``stop``. Defaults to
+            ``end``.
+        :param end: The end of the text. Matches do not extend past it. Defaults to ``len(text)``.
+        :returns: The position conversion stopped at. It can be past ``stop`` if a match crossed it.
+        """
+        size = len(text) if end is None else end
+        stop = size if stop is None else stop
+        if stop - start >= TRANSLATE_THRESHOLD or table.rules is not None:
+            return self.translate_text(text, table, output, start, stop=stop, end=size)
+        lengths = table.lengths
+        get_overlay, get_base = table.overlay_table.get, table.base_table.get
+        append = output.append
+        # Text without matches is output as slices from `run`, instead of one character at a time
+        i = run = start
+        matches = matched_chars = 0
+        while i < stop:
+            limit = min(size - i, SECTION_LENGTH)
+            for length in lengths.get(text[i], ()):
+                if length <= limit:
+                    key = text[i : i + length]
+                    if value := get_overlay(key) or get_base(key):
+                        if run < i:
+                            append(text[run:i])
+                        append(value)
+                        i = run = i + length
+                        matches += 1
+                        matched_chars += length
+                        break
+            else:
+                i += 1
+        if run < i:
+            append(text[run:i])
+        if self.stats is not None:
+            self.stats.add_text(i - start, i - start - matched_chars + matches, matches)
+        return i
+
+    def translate_text(  # noqa: PLR0913
+        self,
+        text: str,
+        table: LayeredTrie,
+        output: list[str],
+        start: int = 0,
+        *,
+        stop: int,
+        end: int,
+        candidates: Iterable[int] | None = None,
+    ) -> int:
+        """Converts plain text like :meth:`convert_text`, looking up only the positions where a
+        key longer than one character can start. The text between them is converted with
+        :meth:`str.translate`. See :class:`~langconv.trie.CharTable`.
+
+        :param candidates: The positions found by :meth:`CharTable.candidates` for ``text[start:
+            stop]``, if they were found already.
+        """
+        chars: CharTable = table.char_table
+        translation = chars.translation
+        append = output.append
+        stats = self.stats
+        i = run = start
+        matches = matched_chars = translated = 0
+        if candidates is None:
+            candidates = chars.candidates(text, start, stop, end)
+        for position in candidates:
+            if position < i:
+                continue
+            match = table.match(text, position, min(end, position + SECTION_LENGTH))
+            if match is None:
+                # No key at all, so the character is left as is by `translation` as well
+                i = position + 1
+                continue
+            if run < position:
+                append(text[run:position].translate(translation))
+                if stats is not None:
+                    translated += _count_translated(text, run, position, translation)
+            append(match[1])
+            i = run = position + match[0]
+            matches += 1
+            matched_chars += match[0]
+        i = max(i, stop)
+        if run < i:
+            append(text[run:i].translate(translation))
+            if stats is not None:
+                translated += _count_translated(text, run, i, translation)
+        if stats is not None:
+            stats.add_text(i - start, i - start - matched_chars + matches, matches + translated)
+        return i
+
+    def convert_html(  # noqa: PLR0913
+        self,
+        text: str,
+        state: 'DocumentState',
+        output: list[str],
+        start: int = 0,
+        *,
+        stop: int | None = None,
+        end: int | None = None,
+        final: bool = True,
+    ) -> int:
+        """Converts HTML (without markup), appending to ``output``. See :meth:`convert_text`.
+
+        Only text content is converted: tags with their attributes, comments and the content of
+        :data:`RAW_TEXT_ELEMENTS` are output as is, and matches do not span tags. The HTML code
+        the text ends in is kept in ``state.html``, so that HTML can be converted in pieces.
+
+        :param final: Whether the text ends at ``end``. If not, conversion stops before HTML code
+            that can still be continued by the following text.
+        """
+        closings = state.html
+        assert closings is not None
+        size = len(text) if end is None else end
+        stop = size if stop is None else stop
+        i = start
+        while i < stop:
+            if closings and closings[0] in _TAG_STATES:
+                # In a tag: output it up to its end
+                begin, i = i, _skip_tag(text, i, size, closings)
+                output.append(text[begin:i])
+                continue
+            if closings:
+                # In other HTML code: output it up to where it ends
+                found = _closing_pattern(closings[0]).search(text, i, size)
+                if found is None:
+                    done = size if final else max(i, size - len(closings[0]))
+                    output.append(text[i:done])
+                    return done
+                output.append(text[i : found.end()])
+                i = found.end()
+                del closings[0]
+                continue
+
+            tag = _TAG_START.search(text, i, size)
+            if tag is None or tag.start() > i:
+                boundary = size if tag is None else tag.start()
+                i = self.convert_text(
+                    text, state.table, output, i, stop=min(stop, boundary), end=boundary
+                )
+                continue
+
+            if text.startswith('<!--', i, size):
+                output.append('<!--')
+                i += 4
+                closings.append('-->')
+                continue
+            name = _TAG_NAME.match(text, i, size)
+            if not final and (name is None or name.end() == size) and text.find('>', i, size) == -1:
+                # The tag name can still be continued
+                return i
+            closings.append('>')
+            begin, i = i, _skip_tag(text, i + 1 if name is None else name.end(), size, closings)
+            output.append(text[begin:i])
+            if (
+                name is not None
+                and text[begin + 1] != '/'
+                and (closings or text[i - 2] != '/')
+                and name[1].lower() in RAW_TEXT_ELEMENTS
+            ):
+                closings.extend((f'</{name[1]}', '>'))
+        return i
+
     def insert_rule(
         self,
         rule: LCMarkup.Unidirectional | LCMarkup.Omnidirectional,
-        trie: Trie,
+        trie: Trie | RuleLayer,
         language: Language,
     ) -> None:
         result = rule.localize(language)
         if result:
-            for key, value in result[0].items():
-                trie.insert(key, value)
+            trie.update(result[0])
+            if self.stats is not None:
+                self.stats.add_rules(inserted=len(result[0]))
 
     def delete_rule(
         self,
         rule: LCMarkup.Unidirectional | LCMarkup.Omnidirectional,
-        trie: Trie,
+        trie: Trie | RuleLayer,
         language: Language,
     ) -> None:
         result = rule.localize(language)
         if result:
-            for key, _ in result[0].items():
-                trie.delete(key)
+            trie.remove_many(result[0])
+            if self.stats is not None:
+                self.stats.add_rules(deleted=len(result[0]))
 
     def divide(self, text: str):
         segments: list[str | LCMarkup] = []
         pointer = 0
-        raw_markups = re.finditer(r'(?P<markup>-{.*?}-)', text)
-        for markup in raw_markups:
-            before = text[pointer : markup.start()]
+        while True:
+            start, end = find_markup(text, pointer, final=True)
+            if end == -1:
+                break
+            before = text[pointer:start]
             if before:
                 segments.append(before)
-            segments.append(LCMarkup.parse(markup.group()))
-            pointer = markup.end()
+            segments.append(self._parse_markup(text, start, end))
+            pointer = end
         segments.append(text[pointer:])
 
         return segments
 
+    def _parse_markup(self, text: str, start: int, end: int) -> LCMarkup:
+        markup = LCMarkup.parse(text, start, end)
+        if self.stats is not None:
+            self.stats.add_markup(markup.flag.value)
+        return markup
+
     def convert(
         self,
         text: str,
         *,
         sequential_global: bool = False,
         avoid_html_code: bool = False,
+        markup: bool = True,
     ) -> str:
         """Converts the given text to this language.
 
         :param text: The text to convert.
         :param sequential_global: If true, global conversion rules are parsed and added at where it first appears. Otherwise they are added at initialization, which is not compliant to vanilla MW behavior.
-        :param ignore_html: Whether to ignore "code" HTML tags (<pre>, <code> and <script>).
+        :param avoid_html_code: Whether the text is HTML. If true, only text content is converted:
+            tags, comments and the content of ``<pre>``, ``<code>``, ``<script>`` and ``<style>``
+            are left as is.
+        :param markup: Whether to handle conversion syntax (``-{ ... }-``). If false, the text is
+            converted as plain text.
         """
+        convert = self._convert if self.stats is None else self._convert_timed
+        if self.cache is None:
+            return convert(text, sequential_global, avoid_html_code, markup)
 
-        trie = Trie()
-        segments = self.divide(text)
+        code = self.language.code
+        stamp = (self.get_table(), *self.groups.values())
+        self.cache.validate(stamp, code)
+        key = (text, sequential_global, avoid_html_code, markup)
+        result = self.cache.get(key, code)
+        if result is None:
+            result = convert(text, sequential_global, avoid_html_code, markup)
+            # Not cached if the tables changed since the stamp was taken
+            self.cache.put(key, text, result, code, stamp)
+        return result
 
-        # Filter out global rules (HIDDEN, COPY, REMOVE)
+    def _convert(
+        self, text: str, sequential_global: bool, avoid_html_code: bool, markup: bool
+    ) -> str:
+        if not markup or '-{' not in text:
+            # Fast path for plain text: no per-document rules to parse or look up
+            output: list[str] = []
+            if avoid_html_code:
+                self.convert_html(text, DocumentState(self.get_table(), html=[]), output)
+            else:
+                self.convert_text(text, self.get_table(), output)
+            return ''.join(output)
+
+        return self.convert_divided(self.divide(text), sequential_global, avoid_html_code)
+
+    def _convert_timed(
+        self, text: str, sequential_global: bool, avoid_html_code: bool, markup: bool
+    ) -> str:
+        # Same as `_convert`, recording the time spent in each phase to `stats`
+        assert self.stats is not None
+        clock = time.perf_counter
+        started = clock()
+        if markup and '-{' in text:
+            segments = self.divide(text)
+            divided = clock()
+            state = DocumentState(self.get_table(), html=[] if avoid_html_code else None)
+            if not sequential_global:
+                segments = self.apply_global_rules(segments, state)
+            applied = clock()
+            result = self.convert_segments(segments, state, apply_rules=sequential_global)
+        else:
+            divided = applied = started
+            result = self._convert(text, sequential_global, avoid_html_code, markup=False)
+        self.stats.add_document(
+            {'divide': divided - started, 'rules': applied - divided, 'convert': clock() - applied}
+        )
+        return result
+
+    def convert_divided(
+        self, segments: list[str | LCMarkup], sequential_global: bool, html: bool = False
+    ) -> str:
+        """Converts text divided by :meth:`divide`, with the rules of the document only.
+
+        :param sequential_global: See :meth:`convert`.
+        :param html: Whether the text is HTML. See ``avoid_html_code`` of :meth:`convert`.
+        """
+        state = DocumentState(self.get_table(), html=[] if html else None)
         if not sequential_global:
-            for segment in segments.copy():
-                if isinstance(segment, str) or not isinstance(
-                    segment.rule, LCMarkup.Unidirectional | LCMarkup.Omnidirectional
-                ):
-                    continue
-                if segment.flag in (segment.Flag.HIDDEN, segment.Flag.COPY):
-                    self.insert_rule(segment.rule, trie, self.language)
-                elif segment.flag == segment.Flag.REMOVE:
-                    self.delete_rule(segment.rule, trie, self.language)
-                if segment.flag in (segment.flag.REMOVE, segment.Flag.HIDDEN):
-                    segments.remove(segment)
+            segments = self.apply_global_rules(segments, state)
+        return self.convert_segments(segments, state, apply_rules=sequential_global)
+
+    def convert_pair(
+        self, other: 'LanguageConverter', segments: list[str | LCMarkup], sequential_global: bool
+    ) -> tuple[str, str]:
+        """Converts text divided by :meth:`divide` to the languages of this converter and
+        ``other`` in a single pass. See :func:`convert_multi`.
 
+        :returns: The text converted by this converter and by ``other``.
+        """
+        divergence = self.get_divergence(other)
+        state, other_state = DocumentState(self.get_table()), DocumentState(other.get_table())
+        if not sequential_global:
+            other.apply_global_rules(segments, other_state)
+            segments = self.apply_global_rules(segments, state)
         output: list[str] = []
+        other_output: list[str] = []
         for segment in segments:
             if isinstance(segment, str):
-                i = 0
-                while i < len(segment):
-                    match = self.longest_prefix(segment[i : i + SECTION_LENGTH], [trie])
-                    if match:
-                        output += match.value
-                        i += len(match.full_key)
-                    else:
-                        output.append(segment[i])
-                        i += 1
-                continue
+                table, other_table = state.table, other_state.table
+                extra = (
+                    _differing_keys(table, other_table, overlay_only=True)
+                    if table is not divergence.table or other_table is not divergence.other_table
+                    else None
+                )
+                starts = divergence.starts(segment, extra)
+                self.convert_text_pair(
+                    segment, (table, other_table), starts, (output, other_output)
+                )
+            else:
+                self.apply_markup(segment, state, output, apply_rules=sequential_global)
+                other.apply_markup(
+                    segment, other_state, other_output, apply_rules=sequential_global
+                )
+        return ''.join(output), ''.join(other_output)
 
-            if isinstance(segment.rule, LCMarkup.Raw):
-                output.append(segment.rule.original)
-                continue
+    def convert_text_pair(
+        self,
+        text: str,
+        tables: tuple[LayeredTrie, LayeredTrie],
+        starts: list[int],
+        outputs: tuple[list[str], list[str]],
+    ) -> None:
+        """Converts plain text with two tables in a single pass. See :meth:`convert_text`.
 
-            if not isinstance(
-                segment.rule,
-                LCMarkup.Unidirectional | LCMarkup.Omnidirectional,
-            ):
+        Conversion with the two tables only differs from where a key they map differently is
+        looked up. Elsewhere, the output of the first table is reused for the second one.
+
+        :param starts: The sorted positions where keys mapped differently by the tables start.
+        """
+        (table, other_table), (output, other_output) = tables, outputs
+        # The shared runs are translated with the candidates of the whole text, found at once
+        size = len(text)
+        candidates = table.char_table.candidates(text, 0, size, size)
+        i = 0
+        for start in [*starts, size]:
+            if start < i:
                 continue
+            shared = len(output)
+            if start - i >= TRANSLATE_THRESHOLD:
+                found = candidates[bisect_left(candidates, i) : bisect_left(candidates, start)]
+                i = self.translate_text(
+                    text, table, output, i, stop=start, end=size, candidates=found
+                )
+            else:
+                i = self.convert_text(text, table, output, i, stop=start)
+            other_output.extend(output[shared:])
+            if start == size:
+                break
+            if i > start:
+                # `start` was inside a match, so it was not looked up
+                continue
+            # Convert with each table until both are at the same position again
+            j = i
+            while True:
+                if i <= j:
+                    i = self.convert_text(text, table, output, i, stop=i + 1)
+                else:
+                    j = self.convert_text(text, other_table, other_output, j, stop=j + 1)
+                if i == j:
+                    break
 
-            if segment.flag in (segment.Flag.SHOW, segment.Flag.COPY):
-                output.append((segment.rule.localize(self.language) or (None, ''))[1])
+    def get_divergence(self, other: 'LanguageConverter') -> '_Divergence':
+        """Gets the keys mapped differently by the tables of this converter and ``other``."""
+        table, other_table = self.get_table(), other.get_table()
+        cached = self._divergences.get(id(other_table))
+        if cached is None or cached[0] is not table or cached[1] is not other_table:
+            cached = self._divergences[id(other_table)] = (
+                table,
+                other_table,
+                _Divergence.between(table, other_table),
+            )
+        return cached[2]
 
-            if sequential_global:
+    def apply_global_rules(
+        self, segments: list[str | LCMarkup], state: 'DocumentState'
+    ) -> list[str | LCMarkup]:
+        """Applies the global rules (HIDDEN, COPY, REMOVE, GROUP) in ``segments`` to ``state`` up
+        front.
+
+        :returns: The segments without the global rules that have no output.
+        """
+        groups: list[LCMarkup] = []
+        remaining: list[str | LCMarkup] = []
+        for segment in segments:
+            if isinstance(segment, str):
+                remaining.append(segment)
+                continue
+            if segment.flag == segment.Flag.GROUP:
+                groups.append(segment)
+                continue
+            if isinstance(segment.rule, LCMarkup.Unidirectional | LCMarkup.Omnidirectional):
                 if segment.flag in (segment.Flag.HIDDEN, segment.Flag.COPY):
-                    self.insert_rule(segment.rule, trie, self.language)
+                    self.insert_rule(segment.rule, state.rules, self.language)
                 elif segment.flag == segment.Flag.REMOVE:
-                    self.delete_rule(segment.rule, trie, self.language)
+                    self.delete_rule(segment.rule, state.rules, self.language)
+                if segment.flag in (segment.flag.REMOVE, segment.Flag.HIDDEN):
+                    continue
+            remaining.append(segment)
+        self.apply_groups(groups, state)
+        return remaining
+
+    def apply_groups(self, markups: Iterable[LCMarkup], state: 'DocumentState') -> None:
+        """Layers the conversion groups named in ``-{G|...}-`` blocks on top of ``state.base``.
 
-            # TODO: Handle `avoid_html_code`
+        Groups used later take precedence. Unknown groups are ignored.
+        """
+        tables = [
+            self.groups[name].compile(self.language)
+            for markup in markups
+            if isinstance(markup.rule, LCMarkup.Raw)
+            for name in (name.strip() for name in markup.rule.original.split(';'))
+            if name in self.groups
+        ]
+        state.base = state.base.overlay(*tables)
 
+    def convert_segments(
+        self, segments: list[str | LCMarkup], state: 'DocumentState', *, apply_rules: bool
+    ) -> str:
+        """Converts text divided by :meth:`divide`, with the rules of the document in ``state``.
+
+        :param apply_rules: Whether to apply global rules to ``state`` as they appear.
+        """
+        output: list[str] = []
+        for segment in segments:
+            if isinstance(segment, str):
+                if state.html is None:
+                    self.convert_text(segment, state.table, output)
+                else:
+                    self.convert_html(segment, state, output)
+            else:
+                self.apply_markup(segment, state, output, apply_rules=apply_rules)
         return ''.join(output)
 
+    def convert_incremental(
+        self,
+        text: str,
+        previous: 'ConvertedDocument | None' = None,
+        *,
+        sequential_global: bool = False,
+    ) -> 'ConvertedDocument':
+        """Converts a document, reusing the chunks of a previous version that did not change.
+
+        The document is split into lines, which no match or markup can span (unless the tables
+        have keys containing line breaks, in which case it is converted as a single chunk). Each
+        converted chunk is cached by a digest of its text and the global rules in effect for it,
+        so a chunk is converted again if it changed, or if global rules affecting it changed.
+
+        :param text: The new version of the document.
+        :param previous: The result of converting a previous version of the document.
+        :param sequential_global: See :meth:`convert`.
+        :returns: The converted document, which is to be passed as ``previous`` next time.
+        """
+        base = self.get_table()
+        cached = previous.chunks if previous is not None and previous.table is base else {}
+        chunks = _split_lines(text, base)
+        parsed: list[list[str | LCMarkup]] = [
+            self.divide(chunk) if '-{' in chunk else [chunk] for chunk in chunks
+        ]
+
+        state = DocumentState(base)
+        rules = hashlib.blake2b(b'sequential' if sequential_global else b'global')
+        if not sequential_global:
+            for segments in parsed:
+                for segment in _global_rules(segments):
+                    rules.update(self._rule_digest(segment))
+            parsed = [self.apply_global_rules(segments, state) for segments in parsed]
+
+        result = ConvertedDocument('', {}, base)
+        output: list[str] = []
+        for chunk, segments in zip(chunks, parsed, strict=True):
+            key = hashlib.blake2b(chunk.encode(), digest_size=16, key=rules.digest()).digest()
+            converted = cached.get(key)
+            if converted is None:
+                converted = self.convert_segments(segments, state, apply_rules=sequential_global)
+            else:
+                result.reused += 1
+                if sequential_global:
+                    for segment in _global_rules(segments):
+                        self.apply_markup(segment, state, [], apply_rules=True)
+            if sequential_global:
+                for segment in _global_rules(segments):
+                    rules.update(self._rule_digest(segment))
+            result.chunks[key] = converted
+            output.append(converted)
+        result.text = ''.join(output)
+        return result
+
+    def _rule_digest(self, markup: LCMarkup) -> bytes:
+        if markup.flag == markup.Flag.GROUP and isinstance(markup.rule, LCMarkup.Raw):
+            # A group can be replaced without changing the document
+            names = (name.strip() for name in markup.rule.original.split(';'))
+            return b''.join(self.groups[name].digest for name in names if name in self.groups)
+        return repr(markup).encode()
+
+    def iter_convert(
+        self, chunks: Iterable[str], *, markup: bool = True, avoid_html_code: bool = False
+    ) -> Iterator[str]:
+        """Converts text given in chunks, yielding the converted text as it becomes available.
+
+        Text of any size is converted in bounded memory: only the end of the previous chunk is
+        held back, so that matches and markup spanning chunks are handled. Blocks longer than
+        :data:`MAX_HELD_MARKUP` characters are not handled as markup. Global rules always
+        apply from where they appear, like ``sequential_global=True`` in :meth:`convert`.
+
+        :param chunks: The text to convert, in chunks of any size.
+        :param markup: Whether to handle conversion syntax. See :meth:`convert`.
+        :param avoid_html_code: Whether the text is HTML. See :meth:`convert`.
+        """
+        state = DocumentState(self.get_table(), html=[] if avoid_html_code else None)
+        pending = ''
+        for chunk in chunks:
+            pending += chunk
+            output: list[str] = []
+            pending = pending[self._convert_chunk(pending, state, output, markup=markup) :]
+            if output:
+                yield ''.join(output)
+        output = []
+        self._convert_chunk(pending, state, output, markup=markup, final=True)
+        if output:
+            yield ''.join(output)
+
+    def convert_stream(  # noqa: PLR0913
+        self,
+        reader: 'SupportsRead[str]',
+        writer: 'SupportsWrite[str]',
+        chunk_size: int = 1 << 16,
+        *,
+        markup: bool = True,
+        avoid_html_code: bool = False,
+    ) -> None:
+        """Converts text read from ``reader`` and writes it to ``writer``. See :meth:`iter_convert`.
+
+        :param reader: A text file-like object to read from.
+        :param writer: A text file-like object to write to.
+        :param chunk_size: The number of characters to read at a time.
+        :param markup: Whether to handle conversion syntax. See :meth:`convert`.
+        :param avoid_html_code: Whether the text is HTML. See :meth:`convert`.
+        """
+        chunks = iter(partial(reader.read, chunk_size), '')
+        for converted in self.iter_convert(chunks, markup=markup, avoid_html_code=avoid_html_code):
+            writer.write(converted)
+
+    def _convert_chunk(  # noqa: PLR0913
+        self,
+        text: str,
+        state: 'DocumentState',
+        output: list[str],
+        *,
+        markup: bool,
+        final: bool = False,
+    ) -> int:
+        """Converts as much of ``text`` as possible without knowing the text after it.
+
+        :returns: The position where conversion stopped. The rest must be passed again together
+            with the next chunk.
+        """
+        pointer = search = 0
+        while True:
+            start, end = find_markup(text, search, final=final) if markup else (-1, -1)
+            if end == -1 and start != -1 and len(text) - start > MAX_HELD_MARKUP:
+                search = start + 1
+                continue
+            if end == -1 and not final:
+                # Hold back text which can still be followed by markup or a longer match
+                boundary = len(text) - (markup and text.endswith('-')) if start == -1 else start
+                stop = boundary - (SECTION_LENGTH - 1)
+                if state.html is not None:
+                    return self.convert_html(
+                        text, state, output, pointer, stop=stop, end=boundary, final=False
+                    )
+                return self.convert_text(
+                    text, state.table, output, pointer, stop=stop, end=boundary
+                )
+            boundary = len(text) if start == -1 else start
+            if pointer < boundary:
+                if state.html is not None:
+                    self.convert_html(text, state, output, pointer, end=boundary)
+                else:
+                    self.convert_text(text, state.table, output, pointer, end=boundary)
+            if start == -1:
+                return len(text)
+            self.apply_markup(self._parse_markup(text, start, end), state, output, apply_rules=True)
+            pointer = search = end
+
+    def get_table(self) -> LayeredTrie:
+        """Gets the table of :attr:`rules` to convert with."""
+        compiled = [rule.compile() for rule in self.rules]
+        cached = self._table
+        if cached is None or not same_objects(compiled, cached[0]):
+            # Replaced at once, as other threads may be reading it
+            cached = self._table = (compiled, LayeredTrie.from_tries(compiled))
+        return cached[1]
+
+    def apply_markup(
+        self, markup: LCMarkup, state: 'DocumentState', output: list[str], *, apply_rules: bool
+    ) -> None:
+        """Outputs a markup block, and applies its global rules to ``state`` if ``apply_rules``."""
+        if markup.flag == markup.Flag.GROUP:
+            if apply_rules:
+                self.apply_groups([markup], state)
+            return
+
+        if isinstance(markup.rule, LCMarkup.Raw):
+            self._output_nested(markup.rule.original, state, output)
+            return
+
+        if not isinstance(markup.rule, LCMarkup.Unidirectional | LCMarkup.Omnidirectional):
+            return
+
+        if markup.flag in (markup.Flag.SHOW, markup.Flag.COPY):
+            localized = markup.rule.localize(self.language)
+            self._output_nested(localized[1] if localized else '', state, output)
+
+        if apply_rules:
+            if markup.flag in (markup.Flag.HIDDEN, markup.Flag.COPY):
+                self.insert_rule(markup.rule, state.rules, self.language)
+            elif markup.flag == markup.Flag.REMOVE:
+                self.delete_rule(markup.rule, state.rules, self.language)
+
+    def _output_nested(self, text: str, state: 'DocumentState', output: list[str]) -> None:
+        # Text in markup is not converted, except for the markup nested in it
+        if '-{' not in text:
+            output.append(text)
+            return
+        for segment in self.divide(text):
+            if isinstance(segment, str):
+                output.append(segment)
+            else:
+                self.apply_markup(segment, state, output, apply_rules=False)
+
+    def convert_many(
+        self,
+        texts: Iterable[str],
+        *,
+        workers: int | None = None,
+        chunksize: int = 256,
+        **options: Any,
+    ) -> list[str]:
+        """Converts many texts in a pool of worker processes.
+
+        Each worker receives this converter once when it starts, and texts are sent to the workers
+        in batches of ``chunksize``.
+
+        :param texts: The texts to convert.
+        :param workers: The number of worker processes. Defaults to the number of CPUs. If 1, the
+            texts are converted in the current process.
+        :param chunksize: The number of texts sent to a worker at a time.
+        :param options: Keyword arguments passed to :meth:`convert`.
+        :returns: The converted texts, in the same order as ``texts``.
+        """
+        if workers == 1:
+            return [self.convert(text, **options) for text in texts]
+        with self.create_executor(workers) as executor:
+            results = executor.map(_convert_batch, _batched(texts, chunksize), repeat(options))
+            return [text for batch in results for text in batch]
+
+    def create_executor(self, workers: int | None = None) -> 'ProcessPoolExecutor':
+        """Creates a process pool whose workers have this converter loaded.
+
+        Passing it to :meth:`aconvert` and :meth:`aconvert_many` avoids sending the converter to
+        the workers with every call.
+
+        :param workers: The number of worker processes. Defaults to the number of CPUs.
+        """
+        # Imported here (as is asyncio), as it is slow to import and not needed by most programs
+        from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self,))
+        _executor_converters[executor] = self
+        return executor
+
+    async def aconvert(
+        self,
+        text: str,
+        *,
+        executor: Executor | None = None,
+        inline_threshold: int = INLINE_THRESHOLD,
+        **options: Any,
+    ) -> str:
+        """Converts the given text without blocking the event loop. See :meth:`convert`.
+
+        Conversion runs in ``executor``, unless the text is short enough that handing it over
+        would cost more than converting it. Cancelling the call cancels the conversion if it has
+        not started yet; otherwise its result is discarded.
+
+        :param executor: The executor to convert in. Defaults to the event loop's default
+            executor, a thread pool. Use a thread pool on free-threaded Python, or a process pool
+            (ideally from :meth:`create_executor`) otherwise.
+        :param inline_threshold: Texts shorter than this are converted in the event loop.
+        :param options: Keyword arguments passed to :meth:`convert`.
+        """
+        if len(text) < inline_threshold:
+            return self.convert(text, **options)
+        return (await self._run_in_executor(executor, [text], options))[0]
+
+    async def aconvert_many(
+        self,
+        texts: Iterable[str],
+        *,
+        executor: Executor | None = None,
+        chunksize: int = 64,
+        limit: int | None = None,
+        **options: Any,
+    ) -> list[str]:
+        """Converts many texts without blocking the event loop. See :meth:`aconvert`.
+
+        :param chunksize: The number of texts converted in one executor call.
+        :param limit: The maximum number of executor calls running at once. Unlimited by default.
+        :returns: The converted texts, in the same order as ``texts``.
+        """
+        import asyncio  # noqa: PLC0415
+
+        semaphore = asyncio.Semaphore(limit) if limit else None
+
+        async def convert_batch(batch: list[str]) -> list[str]:
+            if semaphore is None:
+                return await self._run_in_executor(executor, batch, options)
+            async with semaphore:
+                return await self._run_in_executor(executor, batch, options)
+
+        tasks = [asyncio.ensure_future(convert_batch(b)) for b in _batched(texts, chunksize)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [text for batch in results for text in batch]
+
+    def _run_in_executor(
+        self, executor: Executor | None, texts: list[str], options: dict[str, Any]
+    ) -> 'asyncio.Future[list[str]]':
+        # Workers of pools from `create_executor` already have this converter
+        import asyncio  # noqa: PLC0415
+
+        converter = None if executor and _executor_converters.get(executor) is self else self
+        return asyncio.get_running_loop().run_in_executor(
+            executor, _convert_batch, texts, options, converter
+        )
+
+    @classmethod
+    def from_language(
+        cls,
+        language: Language,
+        *,
+        cache: ConversionCache | None = None,
+        groups: 'dict[str, ConversionGroup] | None' = None,
+        stats: ConversionStats | None = None,
+    ):
+        return cls(language, [language.rules], cache=cache, groups=groups or {}, stats=stats)
+
+
+@define
+class DocumentState:
+    """The conversion rules in effect at a point of a document."""
+
+    base: LayeredTrie
+    """The tables of the converter, with the conversion groups used by the document on top."""
+
+    rules: RuleLayer = field(
+        default=Factory(lambda state: RuleLayer(state.base), takes_self=True), kw_only=True
+    )
+    """The rules defined by the document, which take precedence over ``base``."""
+
+    html: list[str] | None = None
+    """If the document is HTML, the strings ending the HTML code at this point, in order. See
+    :meth:`LanguageConverter.convert_html`. In an attribute value, the ``>`` ending the tag is
+    preceded by the quote of the value, or by ``=`` if the value has not started yet."""
+
+    _table: LayeredTrie | None = field(default=None, init=False, repr=False, eq=False)
+
+    @property
+    def table(self) -> LayeredTrie:
+        """The table to convert with. The same table is returned as rules are added, until
+        ``base`` changes."""
+        if not self.rules.table:
+            return self.base
+        table = self._table
+        if table is None or self.rules.lower is not self.base:
+            if self.rules.lower is not self.base:
+                self.rules.rebase(self.base)
+            table = self._table = self.base.with_rules(self.rules)
+        return table
+
+
+def convert_multi(
+    text: str,
+    languages: Iterable[Language | LanguageConverter],
+    *,
+    sequential_global: bool = False,
+    markup: bool = True,
+) -> dict[str, str]:
+    """Converts ``text`` to several languages at once.
+
+    The text is divided and its markup parsed once for all languages. Languages whose tables mostly
+    agree, such as zh-tw and zh-hk (which share ``hant.json``), are converted in pairs in a single
+    pass, looking text up in the second table only where the two tables differ.
+
+    :param languages: The languages to convert to, or converters for them. Converters created for
+        languages are reused by later calls.
+    :param sequential_global: See :meth:`LanguageConverter.convert`.
+    :param markup: See :meth:`LanguageConverter.convert`.
+    :returns: The converted texts, by language code.
+    """
+    remaining = [_get_converter(language) for language in languages]
+    if not remaining:
+        return {}
+    segments: list[str | LCMarkup] = (
+        remaining[0].divide(text) if markup and '-{' in text else [text]
+    )
+    results: dict[str, str] = {}
+    while remaining:
+        converter = remaining.pop(0)
+        other = min(remaining, key=lambda c: converter.get_divergence(c).ratio, default=None)
+        if other is None or converter.get_divergence(other).ratio > MAX_DIVERGENCE:
+            results[converter.language.code] = converter.convert_divided(
+                segments, sequential_global
+            )
+            continue
+        remaining.remove(other)
+        results[converter.language.code], results[other.language.code] = converter.convert_pair(
+            other, segments, sequential_global
+        )
+    return results
+
+
+def _count_translated(text: str, start: int, stop: int, translation: dict[int, str]) -> int:
+    return sum(map(translation.__contains__, map(ord, text[start:stop])))
+
+
+@cache
+def _closing_pattern(closing: str) -> re.Pattern[str]:
+    # A closing tag must not be followed by more of an element name, e.g. `</scriptx>`
+    end = r'(?=[\s/>])' if closing.startswith('</') else ''
+    return re.compile(re.escape(closing) + end, re.IGNORECASE)
+
+
+def _skip_tag(text: str, start: int, end: int, closings: list[str]) -> int:
+    """Finds the end of the tag ``text[start:end]`` is in, which ``closings`` starts with (see
+    :attr:`DocumentState.html`). Quoted attribute values are skipped, like the tag regex of
+    MediaWiki does, so that they can contain ``>``.
+
+    :returns: The position after the tag, or ``end`` if the tag goes on after it. ``closings`` is
+        updated with the state of the tag at that position.
+    """
+    state, i = closings[0], start
+    if state == '=':
+        value = _ATTRIBUTE_VALUE.match(text, i, end)
+        assert value is not None
+        state, i = _value_state(value, end), value.end()
+    elif state != '>':
+        found = text.find(state, i, end)
+        state, i = (state, end) if found == -1 else ('', found + 1)
+    else:
+        state = ''
+    if not state:
+        for code in _TAG_CODE.finditer(text, i, end):
+            if code[0] == '>':
+                del closings[: closings.index('>') + 1]
+                return code.end()
+            state = _value_state(code, end)
+            if state:
+                break
+    closings[: closings.index('>')] = [state] if state else []
+    return end
+
+
+def _value_state(value: re.Match[str], end: int) -> str:
+    # The state after an attribute value matched up to `end`: the quote it is still in, `=` if it
+    # has not started, or nothing if it is complete
+    quoted = value[1]
+    if quoted is None:
+        return '=' if value.end() == end else ''
+    return '' if len(quoted) > 1 and quoted[-1] == quoted[0] else quoted[0]
+
+
+_language_converters: dict[str, LanguageConverter] = {}
+
+
+def _get_converter(language: Language | LanguageConverter) -> LanguageConverter:
+    if isinstance(language, LanguageConverter):
+        return language
+    converter = _language_converters.get(language.code)
+    if converter is None or converter.language is not language:
+        converter = _language_converters[language.code] = LanguageConverter.from_language(language)
+    return converter
+
+
+@define
+class _Divergence:
+    """The keys two tables map differently, from where conversion with them can differ."""
+
+    table: LayeredTrie
+    other_table: LayeredTrie
+    keys: set[str]
+    lengths: dict[str, tuple[int, ...]]
+    """Lengths of the keys longer than one character, by first character."""
+    char_table: CharTable
+    """Finds where the keys longer than one character can start."""
+    chars: re.Pattern[str]
+    """Matches the keys of one character."""
+    ratio: float
+    """The fraction of keys mapped differently."""
+
     @classmethod
-    def from_language(cls, language: Language):
-        return cls(language, [language.rules])
+    def between(cls, table: LayeredTrie, other_table: LayeredTrie) -> '_Divergence':
+        keys = _differing_keys(table, other_table)
+        lengths: dict[str, set[int]] = {}
+        for key in keys:
+            if len(key) > 1:
+                lengths.setdefault(key[0], set()).add(len(key))
+        chars = ''.join(re.escape(key) for key in keys if len(key) == 1)
+        size = max(len(t.overlay_table) + len(t.base_table) for t in (table, other_table))
+        return cls(
+            table,
+            other_table,
+            keys,
+            {char: tuple(sorted(ls, reverse=True)) for char, ls in lengths.items()},
+            CompiledTrie.from_dict({key: key for key in keys if len(key) > 1}).overlay().char_table,
+            re.compile(f'[{chars}]' if chars else '(?!)'),
+            len(keys) / size if size else 0.0,
+        )
+
+    def starts(self, text: str, extra: set[str] | None = None) -> list[int]:
+        """Finds where the keys (and ``extra`` keys) start in ``text``, in order."""
+        keys, lengths = self.keys, self.lengths
+        result = [match.start() for match in self.chars.finditer(text)]
+        # Only positions starting with the prefix of a key are checked in Python
+        for i in self.char_table.candidates(text, 0, len(text), len(text)):
+            for length in lengths[text[i]]:
+                if text[i : i + length] in keys:
+                    result.append(i)
+                    break
+        for key in extra or ():
+            i = text.find(key)
+            while i != -1:
+                result.append(i)
+                i = text.find(key, i + 1)
+        return sorted(set(result))
+
+
+def _differing_keys(
+    table: LayeredTrie, other_table: LayeredTrie, *, overlay_only: bool = False
+) -> set[str]:
+    layers: list[Mapping[str, str]] = [table.overlay_table, other_table.overlay_table]
+    layers += [t.rules.table for t in (table, other_table) if t.rules is not None]
+    if not overlay_only:
+        layers += [table.base_table, other_table.base_table]
+    return {key for layer in layers for key in layer if table.get(key) != other_table.get(key)}
+
+
+@define
+class ConvertedDocument:
+    """A document converted by :meth:`LanguageConverter.convert_incremental`."""
+
+    text: str
+    """The converted text."""
+
+    chunks: dict[bytes, str]
+    """The converted chunks of the document, by digest of their text and rules in effect."""
+
+    table: LayeredTrie
+    """The table the document was converted with. Chunks are only reused with the same table."""
+
+    reused: int = 0
+    """The number of chunks reused from the previous version."""
+
+
+def _split_lines(text: str, table: LayeredTrie) -> list[str]:
+    # Splitting at line breaks is only safe if no match can contain one
+    if table.multiline:
+        return [text]
+    lines = text.split('\n')
+    return [line + '\n' for line in lines[:-1]] + [lines[-1]]
+
+
+def _global_rules(segments: list[str | LCMarkup]) -> Iterator[LCMarkup]:
+    for segment in segments:
+        if isinstance(segment, str):
+            continue
+        if segment.flag == segment.Flag.GROUP or (
+            isinstance(segment.rule, LCMarkup.Unidirectional | LCMarkup.Omnidirectional)
+            and segment.flag in (segment.Flag.HIDDEN, segment.Flag.COPY, segment.Flag.REMOVE)
+        ):
+            yield segment
+
+
+_worker_converter: LanguageConverter | None = None
+_executor_converters: 'WeakKeyDictionary[Executor, LanguageConverter]' = WeakKeyDictionary()
+
+
+def _init_worker(converter: LanguageConverter) -> None:
+    global _worker_converter  # noqa: PLW0603
+    _worker_converter = converter
+
+
+def _convert_batch(
+    texts: list[str], options: dict[str, Any], converter: LanguageConverter | None = None
+) -> list[str]:
+    converter = converter or _worker_converter
+    assert converter is not None
+    return [converter.convert(text, **options) for text in texts]
+
+
+def _batched(iterable: Iterable[str], size: int) -> Iterator[list[str]]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,112 @@
+"""Conversion groups: sets of conversion rules shared by many documents.
+
+Like MediaWiki's conversion groups (used through ``{{NoteTA|G1=...}}``), a group collects the rules
+of a topic, such as IT terms or place names, so that documents do not have to repeat them as
+``-{H|...}-`` rules. A group is parsed once and compiled once per language, and documents use it
+with ``-{G|name}-`` (or ``-{G|name1;name2}-``)::
+
+    it = ConversionGroup.from_dict({'name': 'IT', 'rules': ['zh-cn:字节; zh-tw:位元組']})
+    converter = LanguageConverter.from_language(zh_tw)
+    converter.groups[it.name] = it
+    converter.convert('-{G|IT}-字节')  # '位元組'
+
+Rules of a group apply to the whole document (or from where it is used, with
+``sequential_global``), and rules defined by the document take precedence over them.
+"""
+
+import hashlib
+import json
+from collections.abc import Iterable, Mapping
+from typing import cast
+
+from attrs import Factory, define, field
+
+from langconv.converter import LCMarkup, find_markup
+from langconv.language import Language
+from langconv.trie import CompiledTrie
+
+GroupRule = LCMarkup.Unidirectional | LCMarkup.Omnidirectional
+
+
+@define(frozen=True)
+class ConversionGroup:
+    name: str
+    rules: tuple[GroupRule, ...] = field(converter=tuple)
+    """The rules of the group, from lowest to highest precedence."""
+    digest: bytes = field(
+        default=Factory(lambda group: _digest(group.rules), takes_self=True),
+        init=False,
+        repr=False,
+        eq=False,
+    )
+    """A digest of :attr:`rules`."""
+    _tables: dict[tuple[str, ...], CompiledTrie] = field(
+        factory=dict[tuple[str, ...], CompiledTrie], init=False, repr=False, eq=False
+    )
+
+    def compile(self, language: Language) -> CompiledTrie:
+        """Compiles the rules of the group for ``language``. The result is cached."""
+        key = (language.code, *language.fallbacks)
+        table = self._tables.get(key)
+        if table is None:
+            mapping: dict[str, str] = {}
+            for rule in self.rules:
+                result = rule.localize(language)
+                if result:
+                    mapping.update(result[0])
+            table = self._tables[key] = CompiledTrie.from_dict(mapping)
+        return table
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> 'ConversionGroup':
+        """Creates a group from a dict like::
+
+        {
+            'name': 'IT',
+            'rules': [
+                'zh-cn:字节; zh-tw:位元組',  # Same syntax as in -{H|...}-
+                {'zh-cn': '内存', 'zh-tw': '記憶體'},  # Or a dict of variants
+            ],
+        }
+        """
+        name, raw_rules = data['name'], data['rules']
+        if not isinstance(name, str) or not isinstance(raw_rules, Iterable):
+            raise ValueError('A conversion group needs a name and a list of rules')
+        rules: list[GroupRule] = []
+        for raw in cast('Iterable[object]', raw_rules):
+            if isinstance(raw, Mapping):
+                variants = cast('Mapping[str, str]', raw)
+                rule = LCMarkup.Omnidirectional(mapping={k.lower(): v for k, v in variants.items()})
+            else:
+                rule = LCMarkup.parse_rules(str(raw))
+            if isinstance(rule, GroupRule):
+                rules.append(rule)
+        return cls(name, rules)
+
+    @classmethod
+    def from_json_file(cls, file: str) -> 'ConversionGroup':
+        """Creates a group from a JSON file in the format of :meth:`from_dict`."""
+        with open(file, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_markup(cls, name: str, text: str) -> 'ConversionGroup':
+        """Creates a group from the ``-{H|...}-`` (or ``-{A|...}-``) rules in ``text``, such as a
+        page of group rules. Other text and markup are ignored."""
+        rules: list[GroupRule] = []
+        pointer = 0
+        while True:
+            start, end = find_markup(text, pointer, final=True)
+            if end == -1:
+                break
+            markup = LCMarkup.parse(text, start, end)
+            if markup.flag in (markup.Flag.HIDDEN, markup.Flag.COPY) and isinstance(
+                markup.rule, GroupRule
+            ):
+                rules.append(markup.rule)
+            pointer = end
+        return cls(name, rules)
+
+
+def _digest(rules: tuple[GroupRule, ...]) -> bytes:
+    return hashlib.blake2b(repr(rules).encode(), digest_size=16).digest()
@@ -1,28 +1,73 @@
+import contextlib
+import importlib
 import json
+import logging
 import os
+import threading
+from collections.abc import Callable
 
 from attr import field
 from attrs import define
 
 # from iso639.iso639 import Lang
-from langconv.trie import Trie
+from langconv.table import load_table, source_digest
+from langconv.trie import CompiledTrie, Trie
 
+logger = logging.getLogger(__name__)
 
-@define
+
+@define(frozen=True)
 class Language:
-    """Representation of a language."""
+    """Representation of a language.
+
+    Languages are immutable and can be shared by any number of converters and threads, as
+    conversion never modifies :attr:`rules`.
+    """
 
     code: str = field(converter=str.lower)
     rules: Trie
-    fallbacks: list[str]
+    fallbacks: tuple[str, ...] = field(converter=tuple)
 
     @classmethod
-    def from_json_files(cls, code: str, files: list[str], fallbacks: list[str]):
+    def from_json_files(  # noqa: PLR0913
+        cls,
+        code: str,
+        files: list[str],
+        fallbacks: list[str],
+        table_file: str | None = None,
+        *,
+        in_place: bool = False,
+    ):
+        """Creates a language from JSON conversion tables. Later files override earlier ones.
+
+        :param table_file: A binary table compiled from ``files`` (see :mod:`langconv.table`). It
+            is loaded instead of the JSON files unless it is missing or out of date.
+        :param in_place: Whether to read ``table_file`` in place, so that processes share it.
+            See :class:`~langconv.table.MappedTable`. A warning is logged if ``table_file`` is
+            given but cannot be read.
+        """
+        if table_file is not None:
+            table = load_table(table_file, source_digest(files), in_place=in_place)
+            if table is not None:
+                return cls(code, Trie.from_compiled(table), fallbacks)
+            if in_place:
+                logger.warning(
+                    'The binary table of %s cannot be read in place as it is missing or out of '
+                    'date (see langconv.table), loading the JSON files instead: %s',
+                    code,
+                    table_file,
+                )
         content: dict[str, str] = {}
         for file in files:
-            with open(file, encoding='utf-8') as f:
-                content = content | json.load(f)
-        return cls(code, Trie.from_dict(content), fallbacks)
+            content |= load_json_file(file)
+        return cls(code, Trie.from_compiled(CompiledTrie.from_dict(content)), fallbacks)
+
+
+def load_json_file(file: str) -> dict[str, str]:
+    """Parses the given conversion table. Tables are not cached, so that they are freed once the
+    languages are built; the binary tables (see :mod:`langconv.table`) avoid parsing them at all."""
+    with open(file, encoding='utf-8') as f:
+        return json.load(f)
 
 
 def get_data_file_path(filename: str) -> str:
@@ -30,4 +75,41 @@ def get_data_file_path(filename: str) -> str:
     return os.path.abspath(os.path.join(os.path.dirname(__file__), '../data', filename))
 
 
-__all__ = ['Language', 'get_data_file_path']
+_factories: dict[str, Callable[[], Language]] = {}
+_languages: dict[str, Language] = {}
+_lock = threading.Lock()
+
+
+def register_language(code: str, factory: Callable[[], Language]) -> None:
+    """Registers a language to be built by ``factory`` the first time it is requested."""
+    _factories[code.lower()] = factory
+
+
+def get_language(code: str) -> Language:
+    """Gets the language with the given code (e.g. ``zh-tw``), building it on first use.
+
+    Languages bundled with langconv are registered by their module in ``langconv.language``,
+    which is imported automatically based on the code's primary subtag.
+    """
+    code = code.lower().replace('_', '-')
+    language = _languages.get(code)
+    if language is not None:
+        return language
+    if code not in _factories:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(f'{__name__}.{code.split("-")[0]}')
+    if code not in _factories:
+        raise LookupError(f'Unknown language: {code}')
+    with _lock:
+        if code not in _languages:
+            _languages[code] = _factories[code]()
+        return _languages[code]
+
+
+__all__ = [
+    'Language',
+    'get_data_file_path',
+    'get_language',
+    'load_json_file',
+    'register_language',
+]
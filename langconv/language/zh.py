@@ -1,21 +1,81 @@
-from ..language import Language, get_data_file_path
+import os
+from functools import partial
 
-zh_cn = Language.from_json_files(
-    'zh-cn',
-    [get_data_file_path('zh/hans.json'), get_data_file_path('zh/CN.json')],
-    ['zh-hans'],
+from ..language import (
+    Language,
+    get_data_file_path,
+    get_language,
+    load_json_file,
+    register_language,
 )
+from ..table import dump_table, source_digest
+from ..trie import CompiledTrie
 
-zh_hk = Language.from_json_files(
-    'zh-hk',
-    [get_data_file_path('zh/hant.json'), get_data_file_path('zh/HK.json')],
-    ['zh-hant', 'zh-TW'],
-)
+_variants = {
+    'zh-cn': (['zh/hans.json', 'zh/CN.json'], ['zh-hans']),
+    'zh-hk': (['zh/hant.json', 'zh/HK.json'], ['zh-hant', 'zh-TW']),
+    'zh-tw': (['zh/hant.json', 'zh/TW.json'], ['zh-hant', 'zh-HK']),
+}
+
+
+def load_variant(code: str, *, in_place: bool = False) -> Language:
+    """Loads a variant, e.g. ``zh-tw``. Variants are usually accessed as ``zh_tw`` (or with
+    :func:`~langconv.language.get_language`) instead, which loads them once.
+
+    :param in_place: Whether to read the binary table of the variant in place, e.g. so that the
+        workers of a prefork server share it. See :class:`~langconv.table.MappedTable`.
+    """
+    files, fallbacks = _variants[code]
+    return Language.from_json_files(
+        code,
+        [get_data_file_path(file) for file in files],
+        fallbacks,
+        get_data_file_path(f'zh/{code}.bin'),
+        in_place=in_place,
+    )
+
+
+def load_layers(code: str) -> list[dict[str, str]]:
+    """Loads the JSON tables of a variant, from lowest to highest precedence. See
+    :mod:`langconv.analysis`."""
+    files, _ = _variants[code]
+    return [load_json_file(get_data_file_path(file)) for file in files]
+
+
+for _code in _variants:
+    register_language(_code, partial(load_variant, _code))
+
+
+def build_tables(directory: str) -> None:
+    """Compiles the binary tables of all variants into ``zh`` in ``directory``. See
+    :func:`langconv.table.build_tables`."""
+    os.makedirs(os.path.join(directory, 'zh'), exist_ok=True)
+    # Variants sharing a base table only parse it once, until all tables are built
+    parsed: dict[str, dict[str, str]] = {}
+    for code, (files, _) in _variants.items():
+        paths = [get_data_file_path(file) for file in files]
+        content: dict[str, str] = {}
+        for path in paths:
+            if path not in parsed:
+                parsed[path] = load_json_file(path)
+            content |= parsed[path]
+        dump_table(
+            CompiledTrie.from_dict(content),
+            os.path.join(directory, 'zh', f'{code}.bin'),
+            source_digest(paths),
+        )
+
+
+zh_cn: Language
+zh_hk: Language
+zh_tw: Language
+
+
+def __getattr__(name: str) -> Language:
+    # Variants are only loaded when they are first accessed, e.g. `from langconv.language.zh import zh_cn`
+    if name in __all__:
+        return get_language(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-zh_tw = Language.from_json_files(
-    'zh-tw',
-    [get_data_file_path('zh/hant.json'), get_data_file_path('zh/TW.json')],
-    ['zh-hant', 'zh-HK'],
-)
 
 __all__ = ['zh_cn', 'zh_hk', 'zh_tw']
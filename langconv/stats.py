@@ -0,0 +1,112 @@
+import threading
+from collections import Counter
+from collections.abc import Callable
+
+from attrs import define, field
+
+PHASES = ('divide', 'rules', 'convert')
+# The phases of conversion timed by `ConversionStats`: dividing the text and parsing its markup,
+# applying the global rules of the document, and converting the text
+
+
+@define
+class ConversionStats:
+    """Statistics of the conversions by a :class:`~langconv.converter.LanguageConverter`.
+
+    Statistics are only collected if the converter has them (see
+    :attr:`~langconv.converter.LanguageConverter.stats`), and cost nothing otherwise. Counters are
+    updated by every conversion method, while documents and phase timings are recorded by
+    :meth:`~langconv.converter.LanguageConverter.convert` (and the methods based on it).
+
+    Documents whose result is taken from the :attr:`~langconv.converter.LanguageConverter.cache`
+    are not converted, so they are not recorded here. They are counted in
+    :attr:`~langconv.cache.ConversionCache.hits` instead.
+    """
+
+    callback: 'Callable[[ConversionStats, dict[str, float]], None] | None' = field(
+        default=None, eq=False
+    )
+    """Called after each document is converted, with these statistics and the seconds spent in
+    each phase of converting it (see :data:`PHASES`), e.g. to export them to a metrics system."""
+
+    documents: int = field(default=0, init=False)
+    """The number of documents converted."""
+    chars: int = field(default=0, init=False)
+    """The number of characters of text looked up in the tables."""
+    matches: int = field(default=0, init=False)
+    """The number of lookups that matched a key."""
+    misses: int = field(default=0, init=False)
+    """The number of lookups that matched no key, where the character is output as is."""
+    markup: Counter[str] = field(factory=Counter[str], init=False)
+    """The number of markup blocks parsed, by flag (see :class:`~langconv.converter.LCMarkup.Flag`)."""
+    rules_inserted: int = field(default=0, init=False)
+    """The number of keys inserted by the rules of documents."""
+    rules_deleted: int = field(default=0, init=False)
+    """The number of keys deleted by the rules of documents."""
+    timings: dict[str, float] = field(factory=lambda: dict.fromkeys(PHASES, 0.0), init=False)
+    """The total seconds spent in each phase."""
+
+    _lock: threading.Lock = field(factory=threading.Lock, init=False, repr=False, eq=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that matched a key."""
+        lookups = self.matches + self.misses
+        return self.matches / lookups if lookups else 0.0
+
+    def add_text(self, chars: int, lookups: int, matches: int) -> None:
+        """Counts ``chars`` characters converted in ``lookups`` lookups, ``matches`` of which
+        matched a key."""
+        with self._lock:
+            self.chars += chars
+            self.matches += matches
+            self.misses += lookups - matches
+
+    def add_markup(self, flag: str) -> None:
+        """Counts a markup block with ``flag``."""
+        with self._lock:
+            self.markup[flag] += 1
+
+    def add_rules(self, inserted: int = 0, deleted: int = 0) -> None:
+        """Counts keys inserted and deleted by the rules of a document."""
+        with self._lock:
+            self.rules_inserted += inserted
+            self.rules_deleted += deleted
+
+    def add_document(self, timings: dict[str, float]) -> None:
+        """Counts a converted document with the seconds spent in each phase, and calls
+        :attr:`callback`."""
+        with self._lock:
+            self.documents += 1
+            for phase, seconds in timings.items():
+                self.timings[phase] += seconds
+        if self.callback is not None:
+            self.callback(self, timings)
+
+    def as_dict(self) -> dict[str, object]:
+        """Returns the statistics as a dict, e.g. to serialize them."""
+        with self._lock:
+            return {
+                'documents': self.documents,
+                'chars': self.chars,
+                'matches': self.matches,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'markup': dict(self.markup),
+                'rules_inserted': self.rules_inserted,
+                'rules_deleted': self.rules_deleted,
+                'timings': dict(self.timings),
+            }
+
+    def clear(self) -> None:
+        """Resets all statistics."""
+        with self._lock:
+            self.documents = self.chars = self.matches = self.misses = 0
+            self.rules_inserted = self.rules_deleted = 0
+            self.markup.clear()
+            self.timings = dict.fromkeys(PHASES, 0.0)
+
+    def __reduce__(self) -> tuple[type['ConversionStats'], tuple[()]]:
+        # Copies (e.g. in worker processes) start empty, without the callback, which may not be
+        # picklable
+        return type(self), ()
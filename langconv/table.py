@@ -0,0 +1,285 @@
+"""Precompiled binary conversion tables.
+
+Parsing the JSON tables and building a :class:`~langconv.trie.Trie` on every process start is
+slow, so tables can be compiled ahead of time into a compact binary file with::
+
+    python -m langconv.table
+
+The tables are written to a cache directory of the user (see :func:`get_cache_dir`), as the
+package directory is usually not writable. They are looked up there when they are not in the
+package itself, see :func:`load_table`.
+
+The file is read through ``mmap``, so loading it is little more than decoding two strings. Its
+header records a digest of the JSON files it was compiled from, and stale or missing files are
+ignored so that callers can fall back to the JSON files.
+
+A table can also be read in place (see :class:`MappedTable`), so that all the processes using it,
+such as the workers of a prefork server, share a single copy of it in the page cache.
+
+Layout (all integers are little-endian ``uint32``)::
+
+    header      magic, format version, entry count, index count, max key length, digest
+    key_offsets (count + 1) byte offsets into the keys blob
+    val_offsets (count + 1) byte offsets into the values blob
+    index       (index count) pairs of (first code point, bit mask of key lengths)
+    keys        UTF-8 keys sorted by code point, separated by NUL
+    values      UTF-8 values in the same order, separated by NUL
+"""
+
+import hashlib
+import importlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+
+from attrs import define, field
+
+from langconv.trie import CompiledTrie
+
+MAGIC = b'LCTB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4s4I32s')
+SEPARATOR = '\0'
+MAX_KEY_LENGTH = 31
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def source_digest(files: Iterable[str]) -> bytes:
+    """Computes the digest of the source files a table is compiled from."""
+    digest = hashlib.sha256(FORMAT_VERSION.to_bytes(4, 'little'))
+    for file in files:
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def _read_array(data: memoryview) -> 'array[int]':
+    result = array('I')
+    result.frombytes(data)
+    if sys.byteorder != 'little':
+        result.byteswap()
+    return result
+
+
+def _offsets(items: list[str]) -> 'array[int]':
+    offsets = array('I', [0])
+    position = 0
+    for item in items:
+        position += len(item.encode('utf-8')) + 1
+        offsets.append(position)
+    return offsets
+
+
+def dump_table(table: CompiledTrie, path: str, digest: bytes) -> None:
+    """Writes ``table`` to ``path`` in the binary format."""
+    if table.max_length > MAX_KEY_LENGTH:
+        raise ValueError(f'Keys of a binary table cannot be longer than {MAX_KEY_LENGTH}')
+    keys = sorted(table.table)
+    values = [table.table[key] for key in keys]
+    if any(SEPARATOR in item for item in (*keys, *values)):
+        raise ValueError('Keys and values of a binary table cannot contain NUL characters')
+    index = array('I')
+    for char, lengths in sorted(table.lengths.items()):
+        index.append(ord(char))
+        index.append(sum(1 << length for length in lengths))
+    key_offsets, value_offsets = _offsets(keys), _offsets(values)
+    for arr in (key_offsets, value_offsets, index):
+        if sys.byteorder != 'little':
+            arr.byteswap()
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(
+            HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), len(index) // 2, table.max_length, digest)
+        )
+        f.write(key_offsets.tobytes())
+        f.write(value_offsets.tobytes())
+        f.write(index.tobytes())
+        f.write(''.join(key + SEPARATOR for key in keys).encode('utf-8'))
+        f.write(''.join(value + SEPARATOR for value in values).encode('utf-8'))
+    os.replace(tmp, path)
+
+
+def get_cache_dir() -> str:
+    """Gets the directory ``python -m langconv.table`` writes the binary tables to:
+    ``$LANGCONV_CACHE_DIR`` if it is set, or ``langconv`` in the cache directory of the user
+    (``$XDG_CACHE_HOME``, ``~/.cache`` by default)."""
+    directory = os.environ.get('LANGCONV_CACHE_DIR')
+    if directory:
+        return directory
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'langconv')
+
+
+def get_cache_path(path: str) -> str | None:
+    """Gets the path of the binary table of the package data at ``path`` in the cache directory,
+    or None if ``path`` is not in the package data."""
+    try:
+        relative = os.path.relpath(os.path.abspath(path), _DATA_DIR)
+    except ValueError:  # On another drive
+        return None
+    if relative.split(os.sep)[0] == os.pardir:
+        return None
+    return os.path.join(get_cache_dir(), relative)
+
+
+def load_table(
+    path: str, digest: bytes | None = None, *, in_place: bool = False
+) -> CompiledTrie | None:
+    """Loads a binary table from ``path``. If it is missing or stale and ``path`` is in the
+    package data, the table is loaded from the cache directory instead (see
+    :func:`get_cache_path`).
+
+    :param digest: The expected digest of the source files. If given and it does not match, the
+        table is considered stale.
+    :param in_place: Whether to read the keys and values from the file when they are looked up
+        (see :class:`MappedTable`), instead of loading them into a dict.
+    :returns: The table, or None if the file is missing, stale or not a table.
+    """
+    table = _load_file(path, digest, in_place=in_place)
+    cached = get_cache_path(path) if table is None else None
+    if cached is not None:
+        table = _load_file(cached, digest, in_place=in_place)
+    return table
+
+
+def _load_file(path: str, digest: bytes | None, *, in_place: bool) -> CompiledTrie | None:
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    header = _read_header(mm, digest)
+    if header is None:
+        mm.close()
+        return None
+    count, index_count, max_length = header
+    index_start = HEADER.size + 2 * 4 * (count + 1)
+    keys_start = index_start + 4 * index_count * 2
+    with memoryview(mm) as view:
+        index = _read_array(view[index_start:keys_start])
+    masks: dict[int, tuple[int, ...]] = {
+        mask: tuple(length for length in range(max_length, 0, -1) if mask >> length & 1)
+        for mask in set(index[1::2])
+    }
+    lengths: dict[str, tuple[int, ...]] = {
+        chr(char): masks[mask] for char, mask in zip(index[::2], index[1::2], strict=True)
+    }
+    if in_place:
+        return CompiledTrie(MappedTable.from_mmap(path, mm, count, keys_start), lengths, max_length)
+
+    with mm, memoryview(mm) as view:
+        key_offsets = _read_array(view[HEADER.size : HEADER.size + 4 * (count + 1)])
+        values_start = keys_start + key_offsets[-1]
+        keys = str(view[keys_start:values_start], 'utf-8').split(SEPARATOR)
+        values = str(view[values_start:], 'utf-8').split(SEPARATOR)
+    return CompiledTrie(dict(zip(keys[:-1], values[:-1], strict=True)), lengths, max_length)
+
+
+def _read_header(mm: mmap.mmap, digest: bytes | None) -> tuple[int, int, int] | None:
+    if len(mm) < HEADER.size:
+        return None
+    magic, version, count, index_count, max_length, file_digest = HEADER.unpack_from(mm)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    if digest is not None and digest != file_digest:
+        return None
+    return count, index_count, max_length
+
+
+@define(frozen=True, eq=False)
+class MappedTable(Mapping[str, str]):
+    """The keys and values of a binary table, read in place from the mapped file.
+
+    Nothing is copied out of the file but the keys and values looked up, which are found by
+    binary search over the sorted keys. The pages of the file are never written to, so every
+    process mapping it (or forked after mapping it) shares one physical copy in the page cache,
+    instead of each building its own dict. Lookups are several times slower than in a dict, but
+    they are only needed where :class:`~langconv.trie.CharTable` cannot translate the text.
+
+    It is used as the :attr:`~langconv.trie.CompiledTrie.table` of tables loaded with
+    ``load_table(..., in_place=True)``. Copies made by pickling map the file again.
+    """
+
+    path: str
+    _mm: mmap.mmap = field(repr=False)
+    _key_offsets: Sequence[int] = field(repr=False)
+    _value_offsets: Sequence[int] = field(repr=False)
+    _keys_start: int = field(repr=False)
+    _values_start: int = field(repr=False)
+
+    def get(self, key: str, default: str | None = None) -> str | None:  # pyright: ignore[reportIncompatibleMethodOverride]
+        try:
+            data = key.encode('utf-8')
+        except UnicodeEncodeError:
+            return default
+        mm, offsets, start = self._mm, self._key_offsets, self._keys_start
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            found = mm[start + offsets[middle] : start + offsets[middle + 1] - 1]
+            if found < data:
+                low = middle + 1
+            elif found > data:
+                high = middle
+            else:
+                offsets, start = self._value_offsets, self._values_start
+                return mm[start + offsets[middle] : start + offsets[middle + 1] - 1].decode()
+        return default
+
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self._mm[self._keys_start : self._values_start].decode().split(SEPARATOR)
+        return iter(keys[:-1])
+
+    def __len__(self) -> int:
+        return len(self._key_offsets) - 1
+
+    def __reduce__(self) -> tuple[object, tuple[str]]:
+        return _map_table, (self.path,)
+
+    @classmethod
+    def from_mmap(cls, path: str, mm: mmap.mmap, count: int, keys_start: int) -> 'MappedTable':
+        """Reads the table of ``count`` keys mapped as ``mm``, whose keys start at ``keys_start``."""
+        size = 4 * (count + 1)
+        key_offsets = _offsets_view(mm, HEADER.size, size)
+        value_offsets = _offsets_view(mm, HEADER.size + size, size)
+        return cls(path, mm, key_offsets, value_offsets, keys_start, keys_start + key_offsets[-1])
+
+
+def _offsets_view(mm: mmap.mmap, start: int, size: int) -> Sequence[int]:
+    view = memoryview(mm)[start : start + size]
+    # The offsets are read in place, unless the byte order needs converting
+    return view.cast('I') if sys.byteorder == 'little' else _read_array(view)
+
+
+def _map_table(path: str) -> MappedTable:
+    table = load_table(path, in_place=True)
+    if table is None or not isinstance(table.table, MappedTable):
+        raise ValueError(f'Not a binary table: {path}')
+    return table.table
+
+
+def build_tables(module_names: Iterable[str], directory: str | None = None) -> None:
+    """Compiles the binary tables of the given language modules (e.g. ``zh``) into ``directory``,
+    by default :func:`get_cache_dir`. The tables are in the same subdirectories as in the package
+    data, so that :func:`load_table` finds them."""
+    for name in module_names:
+        module = importlib.import_module(f'langconv.language.{name}')
+        module.build_tables(get_cache_dir() if directory is None else directory)
+
+
+if __name__ == '__main__':
+    build_tables(sys.argv[1:] or ['zh'])
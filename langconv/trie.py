@@ -1,66 +1,592 @@
-from attrs import define, field
+import functools
+import re
+import threading
+import weakref
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import compress, count
+from types import ModuleType
+from typing import Any
 
-# NOTE: If the memory usage ever gets too large, we can use ints instead of strs for keys
-# e.g. ord('我') = 25105, sys.getsizeof(25105) = 28, sys.getsizeof('我') = 76
-# saves 48 bytes per CJK key
+from attrs import define, evolve, field
 
+MAX_SEARCHED = 64
+# A `CharTable` searches for up to this many keys added by upper layers, instead of being rebuilt
+NUMPY_MIN_LENGTH = 1 << 8
+# Texts at least this long are searched for candidates with NumPy, if it is installed
+NUMPY_BLOCK_LENGTH = 1 << 20
+# The number of characters NumPy searches at a time, to bound the size of its arrays
 
-@define
+
+@define(weakref_slot=False)
 class Node:
-    key: str
-    value: str
-    full_key: str
-    parent: 'Node | None' = field(default=None)
-    children: dict[str, 'Node'] = field(factory=dict)
+    """A node of a :class:`Trie`.
+
+    To keep large tables small, nodes do not store their key: edges are keyed by code point
+    (an int is cheaper than a one-character str), a node only knows the length of its key, and
+    leaves have no children dict at all.
+    """
+
+    value: str = ''
+    length: int = 0
+    children: 'dict[int, Node] | None' = None
 
     def add_child(self, child: 'Node', key: str) -> None:
-        self.children[key] = child
+        if self.children is None:
+            self.children = {}
+        self.children[ord(key)] = child
 
     def get_child(self, key: str) -> 'Node | None':
-        return self.children.get(key)
+        return None if self.children is None else self.children.get(ord(key))
+
+
+@define(frozen=True)
+class CompiledTrie:
+    """An immutable, flattened form of a :class:`Trie` for fast leftmost-longest matching.
+
+    Instead of walking nodes one character at a time, every key is stored in a flat dict and
+    indexed by its first character, so that a position whose character cannot start any key is
+    rejected with a single lookup, and the remaining positions only probe key lengths that exist.
+    """
+
+    table: Mapping[str, str]
+    """The keys and their values. It is a dict, unless the trie is read in place from a binary
+    table (see :class:`~langconv.table.MappedTable`)."""
+    lengths: dict[str, tuple[int, ...]]
+    """Maps the first character of the keys to their distinct lengths, longest first."""
+    max_length: int
+
+    def match(self, text: str, start: int = 0, stop: int | None = None) -> tuple[int, str] | None:
+        """Finds the longest key at ``text[start:]`` that ends at or before ``stop``.
+
+        :returns: The length of the key and its value, or None if no key matches.
+        """
+        lengths = self.lengths.get(text[start])
+        if lengths is None:
+            return None
+        limit = len(text) if stop is None else min(stop, len(text))
+        table = self.table
+        for length in lengths:
+            end = start + length
+            if end > limit:
+                continue
+            value = table.get(text[start:end])
+            if value:
+                return length, value
+        return None
+
+    def longest_prefix(self, key: str) -> tuple[str, str] | None:
+        """Finds the longest key which is a prefix of ``key``, returning the key and its value."""
+        if not key:
+            return None
+        match = self.match(key)
+        return None if match is None else (key[: match[0]], match[1])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.table
+
+    def __getitem__(self, key: str) -> str | None:
+        return self.table.get(key)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def update(self, changes: Mapping[str, str]) -> 'CompiledTrie':
+        """Returns a copy of this trie with ``changes`` applied. Keys with an empty value are
+        removed.
+
+        This only costs copying the table and indexing the changed keys, instead of building the
+        whole trie again as :meth:`from_dict` does.
+        """
+        table = dict(self.table)
+        added: list[str] = []
+        removed: set[str] = set()
+        for key, value in changes.items():
+            if not key:
+                continue
+            if not value:
+                if table.pop(key, None) is not None:
+                    removed.add(key[0])
+            else:
+                if key not in table:
+                    added.append(key)
+                table[key] = value
+
+        lengths = self.lengths.copy()
+        for char, extra in _index_lengths(added).items():
+            if char not in removed:
+                lengths[char] = tuple(sorted({*extra, *lengths.get(char, ())}, reverse=True))
+        if not removed:
+            max_length = max(self.max_length, *map(len, added), 0)
+            return CompiledTrie(table, lengths, max_length)
+        # The lengths left by removed keys can only be found by going through the keys
+        for char in removed:
+            lengths.pop(char, None)
+        lengths.update(_index_lengths(key for key in table if key[0] in removed))
+        return CompiledTrie(table, lengths, max((ls[0] for ls in lengths.values()), default=0))
+
+    def overlay(self, *tries: 'CompiledTrie') -> 'LayeredTrie':
+        """Layers ``tries`` on top of this one. See :class:`LayeredTrie`."""
+        return LayeredTrie({}, self.table, self.lengths, self.max_length).overlay(*tries)
+
+    @classmethod
+    def from_dict(cls, dictionary: dict[str, str]) -> 'CompiledTrie':
+        table = {key: value for key, value in dictionary.items() if key and value}
+        return cls(table, _index_lengths(table), max(map(len, table), default=0))
+
+
+@functools.cache
+def _import_numpy() -> ModuleType | None:
+    # NumPy is optional, and only imported when a long text is converted
+    try:
+        import numpy  # noqa: PLC0415
+    except ImportError:
+        return None
+    return numpy
+
+
+def _index_lengths(keys: Iterable[str]) -> dict[str, tuple[int, ...]]:
+    """Maps the first character of ``keys`` to their distinct lengths, longest first."""
+    lengths: dict[str, set[int]] = {}
+    for key in keys:
+        lengths.setdefault(key[0], set()).add(len(key))
+    return {char: tuple(sorted(ls, reverse=True)) for char, ls in lengths.items()}
+
+
+@define(frozen=True)
+class CharTable:
+    """A table for converting text with :meth:`str.translate` between the positions where a key
+    longer than one character can start.
+
+    Most positions of a text only match a key of one character (or none), and converting them one
+    by one in Python is slow. Only the candidate positions found by :meth:`candidates` need to be
+    looked up in the full table; the text between them can be translated at once.
+    """
+
+    translation: dict[int, str]
+    """The values of the keys of one character, by code point."""
+    prefixes: set[str]
+    """The first two characters of the longer keys."""
+    pattern: re.Pattern[str]
+    """Matches the first character of a prefix in :attr:`prefixes` (and some other pairs)."""
+    searched: tuple[str, ...] = ()
+    """Keys (or prefixes of keys) whose positions are searched for, as they may not be covered by
+    the other fields."""
+    _arrays: 'list[tuple[Any, Any]]' = field(factory=list[tuple[Any, Any]], eq=False, repr=False)
+    """The NumPy arrays of :attr:`prefixes`, see :meth:`_prefix_arrays`. Tables with the same
+    prefixes share them."""
+    rules: 'RuleLayer | None' = None
+    """Rules on top of the table, whose keys are looked up wherever their first character is."""
+
+    def candidates(self, text: str, start: int, stop: int, end: int) -> list[int]:
+        """Finds the positions in ``text[start:stop]`` where a key longer than one character (or
+        a string in :attr:`searched`) can start, not extending past ``end``, in order.
+
+        Long texts are searched with NumPy if it is installed, see :meth:`_find_prefixes`.
+        """
+        limit = min(stop + 1, end)
+        if limit - start >= NUMPY_MIN_LENGTH and _import_numpy() is not None:
+            positions = self._find_prefixes(text, start, limit)
+        else:
+            prefixes = self.prefixes
+            positions = [
+                match.start()
+                for match in self.pattern.finditer(text, start, limit)
+                if text[match.start() : match.start() + 2] in prefixes
+            ]
+        if self.searched:
+            for string in self.searched:
+                limit = min(stop + len(string) - 1, end)
+                i = text.find(string, start, limit)
+                while i != -1:
+                    positions.append(i)
+                    i = text.find(string, i + 1, limit)
+            positions = sorted(set(positions))
+        if self.rules is not None and self.rules.lengths:
+            firsts = self.rules.lengths.__contains__
+            rest = text[start : max(start, min(stop, end))]
+            positions.extend(compress(count(start), map(firsts, rest)))
+            positions = sorted(set(positions))
+        return positions
+
+    def extend(self, keys: Iterable[str], table: 'LayeredTrie') -> 'CharTable':
+        """Returns the table of ``table``, which is the table of this one with ``keys`` layered on
+        top. Few keys are added to :attr:`searched`, and more are added to the other fields."""
+        searched = (*self.searched, *keys)
+        if len(searched) <= MAX_SEARCHED:
+            return evolve(self, searched=searched, arrays=self._arrays)
+        translation, prefixes = self.translation, self.prefixes
+        singles = {ord(key): table.get(key) or key for key in searched if len(key) == 1}
+        if singles:
+            translation = translation | singles
+        longer = {key[:2] for key in searched if len(key) > 1}
+        if not longer.issubset(prefixes):
+            prefixes = prefixes | longer
+        # Prefixes the pattern does not find are still searched for
+        uncovered = sorted(prefix for prefix in longer if not self.pattern.match(prefix))
+        if len(uncovered) > MAX_SEARCHED:
+            return self.from_table(table)
+        return CharTable(translation, prefixes, self.pattern, tuple(uncovered))
+
+    def _find_prefixes(self, text: str, start: int, limit: int) -> list[int]:
+        """Finds the positions in ``text[start:limit]`` starting with a prefix in :attr:`prefixes`
+        with NumPy, like the pattern and the check in Python do for short texts.
+
+        The text is converted to an array of code points. The positions whose code point can
+        start a prefix are found with a boolean array indexed by code point, and the pairs of code
+        points at these positions are looked up in the sorted array of prefixes.
+        """
+        np = _import_numpy()
+        assert np is not None
+        if not self.prefixes:
+            return []
+        firsts, pairs = self._prefix_arrays()
+        positions: list[int] = []
+        for block in range(start, limit - 1, NUMPY_BLOCK_LENGTH):
+            chunk = text[block : min(block + NUMPY_BLOCK_LENGTH + 1, limit)]
+            codes = np.frombuffer(chunk.encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+            # Code points past the end of `firsts` look up its last entry, which is False
+            found = np.flatnonzero(firsts[np.minimum(codes[:-1], len(firsts) - 1)])
+            keys = codes[found].astype(np.uint64) << 21 | codes[found + 1]
+            indices = np.minimum(np.searchsorted(pairs, keys), len(pairs) - 1)
+            positions.extend((found[pairs[indices] == keys] + block).tolist())
+        return positions
+
+    def _prefix_arrays(self) -> tuple[Any, Any]:
+        if not self._arrays:
+            np = _import_numpy()
+            assert np is not None
+            pairs = sorted(ord(prefix[0]) << 21 | ord(prefix[1]) for prefix in self.prefixes)
+            firsts = np.zeros((pairs[-1] >> 21) + 2, dtype=bool)
+            firsts[[pair >> 21 for pair in pairs]] = True
+            self._arrays.append((firsts, np.array(pairs, dtype=np.uint64)))
+        return self._arrays[0]
+
+    @classmethod
+    def from_table(cls, table: 'LayeredTrie') -> 'CharTable':
+        translation: dict[int, str] = {}
+        for char, lengths in table.lengths.items():
+            if lengths[-1] == 1 and (value := table.get(char)):
+                translation[ord(char)] = value
+        prefixes = {key[:2] for t in (table.overlay_table, table.base_table) for key in t}
+        prefixes = {prefix for prefix in prefixes if len(prefix) > 1}
+        firsts = ''.join(sorted({re.escape(prefix[0]) for prefix in prefixes}))
+        seconds = ''.join(sorted({re.escape(prefix[1]) for prefix in prefixes}))
+        return cls(
+            translation,
+            prefixes,
+            re.compile(f'[{firsts}](?=[{seconds}])' if prefixes else '(?!)'),
+        )
+
+
+@define(frozen=True)
+class LayeredTrie:
+    """A stack of compiled tries looked up as a single table.
+
+    The layers behave as if their tables were merged, with upper layers overriding the entries of
+    lower ones, and the longest key of any layer matches. To avoid copying the large base table
+    for every stack of rules (e.g. per document or per topic), only the upper layers are merged
+    into a small ``overlay`` table, which is looked up before the shared ``base`` table. The index
+    of key lengths covers both, so that each position still takes a single lookup.
+    """
+
+    overlay_table: dict[str, str]
+    base_table: Mapping[str, str]
+    lengths: dict[str, tuple[int, ...]]
+    """Maps the first character of the keys of all layers to their distinct lengths."""
+    max_length: int
+    _last_overlay: 'list[tuple[tuple[weakref.ref[CompiledTrie], ...], LayeredTrie]]' = field(
+        factory=list['tuple[tuple[weakref.ref[CompiledTrie], ...], LayeredTrie]'],
+        eq=False,
+        repr=False,
+    )
+    """The arguments and result of the last call to :meth:`overlay`, as the same tries (e.g. of
+    conversion groups) are usually layered again for each document. They are replaced at once, so
+    that threads layering different rules never get the result of another's. The tries are
+    referenced weakly, and the result is dropped with them, so that this trie does not keep the
+    tables of a finished document alive."""
+    _parent: 'tuple[LayeredTrie, list[str]] | None' = field(
+        default=None, alias='parent', eq=False, repr=False
+    )
+    """The trie this one was layered on with :meth:`overlay`, and the keys of the added layers, to
+    build :attr:`char_table` from the one of that trie."""
+    rules: 'RuleLayer | None' = field(default=None, kw_only=True)
+    """Rules on top of all layers, changed in place. See :meth:`with_rules`."""
+    _char_table: list[CharTable] = field(factory=list[CharTable], init=False, eq=False, repr=False)
+    _multiline: list[bool] = field(factory=list[bool], init=False, eq=False, repr=False)
+
+    @property
+    def char_table(self) -> CharTable:
+        """The :class:`CharTable` of this trie. It is built on first access."""
+        if not self._char_table:
+            if self.rules is not None:
+                table = evolve(self.rules.lower.char_table, rules=self.rules)
+            elif self._parent is None:
+                table = CharTable.from_table(self)
+            else:
+                parent, keys = self._parent
+                table = parent.char_table.extend(keys, self)
+            self._char_table.append(table)
+        return self._char_table[0]
+
+    @property
+    def multiline(self) -> bool:
+        """Whether any key contains a line break. It is found on first access, except for the keys
+        of :attr:`rules`."""
+        if not self._multiline:
+            tables = (self.overlay_table, self.base_table)
+            self._multiline.append(any('\n' in key for table in tables for key in table))
+        return self._multiline[0] or (
+            self.rules is not None and any('\n' in key for key in self.rules.table)
+        )
+
+    def get(self, key: str) -> str | None:
+        """Gets the value of ``key`` in the topmost layer containing it."""
+        if self.rules is not None and (value := self.rules.table.get(key)):
+            return value
+        return self.overlay_table.get(key) or self.base_table.get(key)
+
+    def match(self, text: str, start: int = 0, stop: int | None = None) -> tuple[int, str] | None:
+        """Finds the longest key at ``text[start:]`` that ends at or before ``stop``.
+
+        :returns: The length of the key and its value, or None if no key matches.
+        """
+        limit = len(text) if stop is None else min(stop, len(text))
+        lengths = self.lengths.get(text[start], ())
+        if self.rules is not None:
+            lengths = self.rules.lengths.get(text[start], lengths)
+        for length in lengths:
+            if start + length <= limit and (value := self.get(text[start : start + length])):
+                return length, value
+        return None
+
+    def with_rules(self, rules: 'RuleLayer') -> 'LayeredTrie':
+        """Layers ``rules`` on top of this trie, which must be ``rules.lower``. The tables and the
+        index of this trie are shared, not copied, and changes to ``rules`` apply to the result."""
+        assert rules.lower is self
+        return LayeredTrie(
+            self.overlay_table, self.base_table, self.lengths, self.max_length, rules=rules
+        )
+
+    def overlay(self, *tries: CompiledTrie) -> 'LayeredTrie':
+        """Layers ``tries`` on top of this one, the last one being the topmost. The :attr:`rules`
+        of this trie are not layered on the result."""
+        if not tries:
+            return self
+        cache = self._last_overlay
+        last = cache[-1] if cache else None
+        if (
+            last is not None
+            and len(last[0]) == len(tries)
+            and all(ref() is trie for ref, trie in zip(last[0], tries, strict=True))
+        ):
+            return last[1]
+        overlay_table = self.overlay_table.copy()
+        lengths = self.lengths.copy()
+        for trie in tries:
+            overlay_table.update(trie.table)
+            for char, extra in trie.lengths.items():
+                existing = lengths.get(char)
+                lengths[char] = (
+                    extra
+                    if existing is None
+                    else tuple(sorted(set(existing).union(extra), reverse=True))
+                )
+        max_length = max(self.max_length, *(trie.max_length for trie in tries))
+        parent = (self, [key for trie in tries for key in trie.table])
+        result = LayeredTrie(overlay_table, self.base_table, lengths, max_length, parent=parent)
+
+        def forget(dead: 'weakref.ref[CompiledTrie]') -> None:
+            if cache and any(ref is dead for ref in cache[-1][0]):
+                cache.clear()
+
+        cache[:] = [(tuple(weakref.ref(trie, forget) for trie in tries), result)]
+        return result
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str) -> str | None:
+        return self.get(key)
+
+    @classmethod
+    def from_tries(cls, tries: 'list[CompiledTrie]') -> 'LayeredTrie':
+        """Stacks ``tries``, the first one being the topmost. The largest becomes the base."""
+        if not tries:
+            return cls({}, {}, {}, 0)
+        base = max(range(len(tries)), key=lambda i: len(tries[i]))
+        below = [
+            CompiledTrie.from_dict({k: v for k, v in trie.table.items() if k not in tries[base]})
+            for trie in tries[base + 1 :]
+        ]
+        return tries[base].overlay(*reversed(below), *reversed(tries[:base]))
+
+
+@define
+class RuleLayer:
+    """Rules changed one at a time on top of a :class:`LayeredTrie`, such as the rules a document
+    defines as it is converted. See :meth:`LayeredTrie.with_rules`.
+
+    Layering the rules with :meth:`LayeredTrie.overlay` after each change would copy the index of
+    the whole table and build its :class:`CharTable` again. Instead, the layer has its own table
+    and index, changed in place: a change only indexes the first characters of its keys again, and
+    the positions of these characters are looked up in addition to the candidates of ``lower``.
+    """
+
+    lower: LayeredTrie
+    """The trie the rules are on top of."""
+    table: dict[str, str] = field(factory=dict[str, str], init=False)
+    lengths: dict[str, tuple[int, ...]] = field(
+        factory=dict[str, tuple[int, ...]], init=False, repr=False
+    )
+    """Maps the first character of the keys to the distinct lengths of the keys starting with it,
+    in this layer and in ``lower``, longest first."""
+    _counts: dict[str, Counter[int]] = field(
+        factory=dict[str, Counter[int]], init=False, repr=False
+    )
+    """The number of keys of this layer of each length, by first character."""
+
+    def update(self, mapping: Mapping[str, str]) -> None:
+        """Inserts the keys and values of ``mapping``. Keys with an empty value are removed."""
+        changed: set[str] = set()
+        for key, value in mapping.items():
+            if not key:
+                continue
+            old = self.table.get(key)
+            if value:
+                self.table[key] = value
+                if old is None:
+                    self._counts.setdefault(key[0], Counter())[len(key)] += 1
+                    changed.add(key[0])
+            elif old is not None:
+                del self.table[key]
+                counts = self._counts[key[0]]
+                counts[len(key)] -= 1
+                if not counts[len(key)]:
+                    del counts[len(key)]
+                changed.add(key[0])
+        self._index(changed)
+
+    def remove_many(self, keys: Iterable[str]) -> None:
+        """Removes ``keys``, ignoring the ones that are not in the layer."""
+        self.update(dict.fromkeys(keys, ''))
+
+    def rebase(self, lower: LayeredTrie) -> None:
+        """Moves the rules on top of ``lower``."""
+        self.lower = lower
+        self._index(list(self._counts))
+
+    def _index(self, chars: Iterable[str]) -> None:
+        for char in chars:
+            counts = self._counts[char]
+            if not counts:
+                del self._counts[char]
+                self.lengths.pop(char, None)
+                continue
+            lengths = {*self.lower.lengths.get(char, ()), *counts}
+            self.lengths[char] = tuple(sorted(lengths, reverse=True))
 
 
 @define
 class Trie:
-    root: Node = field(factory=lambda: Node('', '', ''))
+    """A mutable table of conversion rules.
+
+    Modifications and :meth:`compile` are atomic with respect to each other, so a trie can be
+    modified while other threads convert with it: each conversion uses the compiled table of the
+    trie as it was when the conversion started. To replace many rules at once, such as when
+    reloading them, use :meth:`update` and :meth:`remove_many`, so that no conversion sees only
+    part of the changes.
+    """
+
+    _root: Node | None = field(factory=Node)
+    _compiled: CompiledTrie | None = field(default=None, init=False, repr=False, eq=False)
+    _changes: dict[str, str] = field(factory=dict[str, str], init=False, repr=False, eq=False)
+    """The keys changed since :attr:`_compiled` was compiled, with their new values (empty if
+    they were removed), so that compiling again only applies them."""
+    _lock: threading.RLock = field(factory=threading.RLock, init=False, repr=False, eq=False)
+
+    @property
+    def root(self) -> Node:
+        # A trie created with `from_compiled` only builds its nodes when they are needed
+        if self._root is None:
+            with self._lock:
+                if self._root is None:
+                    root = Node()
+                    for key, value in self._compiled.table.items() if self._compiled else ():
+                        _insert(root, key, value)
+                    self._root = root
+        return self._root
+
+    @root.setter
+    def root(self, root: Node) -> None:
+        with self._lock:
+            self._root = root
+            self._compiled = None
+            self._changes.clear()
 
     def insert(self, key: str, value: str) -> None:
-        node = self.root
-        for char in key:
-            child_node = node.children.get(char)
-            if child_node is None:
-                child_node = Node(char, '', node.full_key + char, node)
-                node.add_child(child_node, char)
-            node = child_node
-        node.value = value
+        self.update({key: value})
+
+    def update(self, mapping: Mapping[str, str]) -> None:
+        """Inserts the keys and values of ``mapping``, replacing the values of existing keys.
+        Conversions see either none or all of them."""
+        with self._lock:
+            root = self.root
+            for key, value in mapping.items():
+                _insert(root, key, value)
+            if self._compiled is not None:
+                self._changes.update(mapping)
 
     def search(self, key: str) -> Node | None:
         node = self.root
         for char in key:
-            child_node = node.get_child(char)
+            if node.children is None:
+                return None
+            child_node = node.children.get(ord(char))
             if child_node is None:
                 return None
             node = child_node
         return node
 
     def delete(self, key: str) -> None:
-        node = self.search(key)
-        if node is None:
-            return
-        while True:
-            if node.parent is None:
-                self.root = Node('', '', '')
-                break
-            node.parent.children.pop(node.key, None)
-            if len(node.parent.children) == 0:
+        self.remove_many((key,))
+
+    def remove_many(self, keys: Iterable[str]) -> None:
+        """Removes ``keys``, ignoring the ones that are not in the trie. Conversions see either
+        none or all of the removals."""
+        with self._lock:
+            root = self.root
+            for key in keys:
+                if _delete(root, key) and self._compiled is not None:
+                    self._changes[key] = ''
+
+    def match(self, text: str, start: int = 0, stop: int | None = None) -> tuple[int, str] | None:
+        """Finds the longest key at ``text[start:]`` that ends at or before ``stop``, like
+        :meth:`CompiledTrie.match`. The trie is walked along ``text`` without slicing it.
+
+        :returns: The length of the key and its value, or None if no key matches.
+        """
+        compiled = self._compiled
+        if self._root is None and compiled is not None:
+            return compiled.match(text, start, stop) if start < len(text) else None
+        node = self.root
+        result = None
+        for i in range(start, len(text) if stop is None else min(stop, len(text))):
+            child = None if node.children is None else node.children.get(ord(text[i]))
+            if child is None:
                 break
-            node = node.parent
+            node = child
+            if node.value:
+                result = i + 1 - start, node.value
+        return result
 
     def longest_prefix(self, key: str) -> Node | None:
         node = self.root
         longest_match = None
         for char in key:
-            child = node.get_child(char)
+            if node.children is None:
+                break
+            child = node.children.get(ord(char))
             if child is None:
                 break
             elif child.value:
@@ -69,10 +595,40 @@ class Trie:
 
         return longest_match
 
+    def items(self) -> Iterator[tuple[str, str]]:
+        """Iterates over all keys with a non-empty value and their values."""
+        compiled = self._compiled
+        if self._root is None and compiled is not None:
+            yield from compiled.table.items()
+            return
+        stack = [('', self.root)]
+        while stack:
+            key, node = stack.pop()
+            if node.value:
+                yield key, node.value
+            if node.children is not None:
+                stack.extend((key + chr(code), child) for code, child in node.children.items())
+
+    def compile(self) -> CompiledTrie:
+        """Returns the compiled form of this trie. The result is cached until the trie is modified."""
+        compiled = self._compiled
+        if compiled is None or self._changes:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = CompiledTrie.from_dict(dict(self.items()))
+                elif self._changes:
+                    self._compiled = self._compiled.update(self._changes)
+                    self._changes.clear()
+                compiled = self._compiled
+        return compiled
+
     def __contains__(self, key: str) -> bool:
-        return self.search(key) is not None
+        return bool(self[key])
 
     def __getitem__(self, key: str) -> str | None:
+        compiled = self._compiled
+        if self._root is None and compiled is not None:
+            return compiled[key]
         res = self.search(key)
         return None if res is None else res.value
 
@@ -82,9 +638,58 @@ class Trie:
     def __delitem__(self, key: str) -> None:
         self.delete(key)
 
+    def __getstate__(self) -> tuple[Node | None, CompiledTrie | None]:
+        return self._root, self.compile() if self._changes else self._compiled
+
+    def __setstate__(self, state: tuple[Node | None, CompiledTrie | None]) -> None:
+        self._root, self._compiled = state
+        self._changes = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_compiled(cls, compiled: CompiledTrie) -> 'Trie':
+        """Creates a trie from its compiled form. Nodes are built on first access to ``root``,
+        such as by :meth:`search` or a modification. Until then, lookups use ``compiled``."""
+        obj = cls(None)
+        obj._compiled = compiled
+        return obj
+
     @classmethod
     def from_dict(cls, dictionary: dict[str, str]) -> 'Trie':
         obj = cls()
-        for key, value in dictionary.items():
-            obj.insert(key, value)
+        obj.update(dictionary)
         return obj
+
+
+def _insert(root: Node, key: str, value: str) -> None:
+    node = root
+    for char in key:
+        children = node.children
+        if children is None:
+            children = node.children = {}
+        child_node = children.get(ord(char))
+        if child_node is None:
+            child_node = children[ord(char)] = Node('', node.length + 1)
+        node = child_node
+    node.value = value
+
+
+def _delete(root: Node, key: str) -> bool:
+    path: list[tuple[Node, int]] = []
+    node = root
+    for char in key:
+        child_node = None if node.children is None else node.children.get(ord(char))
+        if child_node is None:
+            return False
+        path.append((node, ord(char)))
+        node = child_node
+    if not node.value:
+        return False
+    node.value = ''
+    # Only the nodes left without a value or children are removed, up to the first one in use
+    while path and not node.value and node.children is None:
+        node, code = path.pop()
+        del node.children[code]  # pyright: ignore[reportOptionalSubscript]
+        if not node.children:
+            node.children = None
+    return True
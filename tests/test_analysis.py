@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from langconv.analysis import analyze_language, analyze_table, prune_language, prune_table
+from langconv.converter import LanguageConverter
+from langconv.language import Language
+from langconv.language.zh import load_layers, zh_cn, zh_hk, zh_tw
+from langconv.trie import Trie
+
+
+def test_analyze_table():
+    base = {'干': '乾', '干净': '乾淨', '净': '淨', '干部': '干部', '若干': '若干', 'x': 'y'}
+    report = analyze_table([base, {'x': 'z', '净': '淨'}])
+    assert report.keys == 6  # noqa: PLR2004
+    assert report.max_length == 2  # noqa: PLR2004
+    assert report.identity == ('干部', '若干')
+    assert (report.shadowed, report.duplicate) == (('x',), ('净',))
+    # '干部' keeps '干' from matching, and '干净' converts to the same without it
+    assert report.redundant == ('干净',)
+    assert '干净' not in prune_table(base)
+
+    # '词组' would match past the end of '单词' without it
+    assert prune_table({'单词': '单词', '词组': 'X'}) == {'单词': '单词', '词组': 'X'}
+    assert prune_table({'单词': '单词', '组': 'X'}) == {'组': 'X'}
+
+    report = analyze_language(zh_tw)
+    assert report.keys == len(zh_tw.rules.compile())
+    assert report.redundant
+
+
+@pytest.mark.parametrize('language', [zh_cn, zh_tw, zh_hk], ids=lambda language: language.code)
+def test_prune_language(language: Language):
+    pruned = prune_language(language)
+    assert len(pruned.rules.compile()) < len(language.rules.compile())
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        texts = [f.read()]
+    texts.append(LanguageConverter.from_language(zh_tw).convert(texts[0]))
+    lc = LanguageConverter.from_language(language)
+    pruned_lc = LanguageConverter.from_language(pruned)
+    for text in texts:
+        assert pruned_lc.convert(text) == lc.convert(text)
+    # Converting the keys tests every key that was removed in the context it is in
+    keys = '\n'.join(key for layer in load_layers(language.code) for key in layer)
+    assert pruned_lc.convert(keys) == lc.convert(keys)
+
+
+def test_prune_random():
+    rnd = random.Random(42)  # noqa: S311
+    for _ in range(200):
+        table = {
+            ''.join(rnd.choices('abc', k=rnd.randint(1, 4))): ''.join(rnd.choices('abcX', k=2))
+            for _ in range(rnd.randint(1, 12))
+        }
+        table |= {key: key for key in rnd.sample(sorted(table), len(table) // 2)}
+        lc = LanguageConverter.from_language(Language('zh-cn', Trie.from_dict(table), []))
+        pruned = LanguageConverter.from_language(
+            Language('zh-cn', Trie.from_dict(prune_table(table)), [])
+        )
+        for _ in range(20):
+            text = ''.join(rnd.choices('abc', k=rnd.randint(0, 12)))
+            assert pruned.convert(text) == lc.convert(text), (table, text)
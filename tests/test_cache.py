@@ -0,0 +1,79 @@
+import sys
+
+from langconv.cache import ConversionCache
+from langconv.converter import LanguageConverter
+from langconv.language import Language
+from langconv.trie import Trie
+
+# pyright: reportOptionalMemberAccess=false
+
+
+def test_lru_eviction():
+    cache = ConversionCache(maxsize=2)
+    cache.put('a', 'a', 'A')
+    cache.put('b', 'b', 'B')
+    assert cache.get('a') == 'A'
+    cache.put('c', 'c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    assert (cache.hits, cache.misses, cache.evictions, len(cache)) == (3, 1, 1, 2)
+
+
+def test_byte_limit():
+    size = sys.getsizeof('a') + sys.getsizeof('A')
+    cache = ConversionCache(maxbytes=2 * size)
+    cache.put('a', 'a', 'A')
+    cache.put('b', 'b', 'B')
+    cache.put('c', 'c', 'C')
+    assert (len(cache), cache.currbytes, cache.evictions) == (2, 2 * size, 1)
+    cache.put('d', 'd' * 100, 'D' * 100)
+    assert cache.get('d') is None
+    assert cache.get('c') == 'C'
+
+
+def test_converter_cache():
+    language = Language('zh-cn', Trie.from_dict({'電腦': '电脑'}), ['zh-hans'])
+    lc = LanguageConverter.from_language(language, cache=ConversionCache())
+    text = '-{H|程式=>zh-cn:程序;}-電腦程式'
+    assert lc.convert(text) == '电脑程序'
+    assert lc.convert(text) == '电脑程序'
+    assert lc.convert(text, markup=False) == '-{H|程式=>zh-cn:程序;}-电脑程式'
+    assert (lc.cache.hits, lc.cache.misses) == (1, 2)
+
+    language.rules.insert('電腦', '计算机')
+    assert lc.convert(text) == '计算机程序'
+    language.rules.delete('電腦')
+    assert lc.convert(text) == '電腦程序'
+
+
+def test_shared_cache():
+    cache = ConversionCache()
+    cn = LanguageConverter.from_language(
+        Language('zh-cn', Trie.from_dict({'電腦': '电脑'}), ['zh-hans']), cache=cache
+    )
+    tw = LanguageConverter.from_language(
+        Language('zh-tw', Trie.from_dict({'电脑': '電腦'}), ['zh-hant']), cache=cache
+    )
+    for _ in range(2):
+        assert cn.convert('電腦电脑') == '电脑电脑'
+        assert tw.convert('電腦电脑') == '電腦電腦'
+    assert (cache.hits, cache.misses, len(cache)) == (2, 2, 2)
+
+    cn.language.rules.insert('電腦', '计算机')
+    assert cn.convert('電腦电脑') == '计算机电脑'
+    assert tw.convert('電腦电脑') == '電腦電腦'
+    assert (cache.hits, len(cache)) == (3, 2)
+
+
+def test_stale_result():
+    cache = ConversionCache()
+    old, new = (object(),), (object(),)
+    cache.validate(old, 'zh-cn')
+    # The tables changed while the result was being computed
+    cache.validate(new, 'zh-cn')
+    cache.put('a', 'a', 'A', 'zh-cn', old)
+    assert cache.get('a', 'zh-cn') is None
+    cache.put('a', 'a', 'A', 'zh-cn', new)
+    assert cache.get('a', 'zh-cn') == 'A'
+    assert cache.get('a', 'zh-tw') is None
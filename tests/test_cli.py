@@ -0,0 +1,69 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+from langconv.cli import main
+
+SOURCE = '-{H|電腦程式=>zh-cn:电脑程序;}-中文維基百科是以電腦程式適應<b title="電腦">電腦</b>\r\n'
+
+
+def test_stdin(monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(SOURCE))
+    assert main(['--to', 'zh-cn', '-q']) == 0
+    out, err = capsys.readouterr()
+    assert out == '中文维基百科是以电脑程序适应<b title="电脑">电脑</b>\r\n'
+    assert err == ''
+
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(SOURCE))
+    assert main(['--to', 'zh-cn', '--html', '--no-markup', '-']) == 0
+    out, err = capsys.readouterr()
+    assert out.startswith('-{H|计算机程序=>zh-cn:电脑程序;}-中文维基百科是以计算机程序')
+    assert out.endswith('<b title="電腦">电脑</b>\r\n')
+    assert err.startswith('langconv: 1 file(s)') and 'MB/s' in err
+
+
+def test_files(tmp_path: Path, capsys: pytest.CaptureFixture[str]):
+    source = tmp_path / 'a.txt'
+    source.write_text(SOURCE, encoding='utf-8', newline='')
+    assert main(['-t', 'zh-cn', '-q', str(source)]) == 0
+    out = capsys.readouterr().out
+    assert out.startswith('中文维基百科')
+
+    assert main(['-t', 'zh-cn', '-q', '-o', str(tmp_path / 'b.txt'), str(source)]) == 0
+    assert (tmp_path / 'b.txt').read_bytes() == out.encode()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.txt', 'b.txt']
+
+    assert main(['-t', 'zh-cn', '-q', '--in-place', str(source)]) == 0
+    assert source.read_bytes() == (tmp_path / 'b.txt').read_bytes()
+
+
+def test_directories(tmp_path: Path):
+    pages = tmp_path / 'pages'
+    (pages / 'sub').mkdir(parents=True)
+    for name in ('a.txt', 'b.txt', 'sub/c.txt'):
+        (pages / name).write_text(SOURCE, encoding='utf-8')
+    (pages / 'sub/bad.txt').write_bytes(b'\xff')
+    (pages / 'sub/flag.txt').write_text('-{X|電腦}-電腦', encoding='utf-8')
+
+    output = tmp_path / 'out'
+    assert main(['-t', 'zh-cn', '-q', '-j', '2', '-o', str(output), str(pages)]) == 1
+    converted = sorted(p.relative_to(output).as_posix() for p in output.rglob('*.txt'))
+    assert converted == ['a.txt', 'b.txt', 'sub/c.txt', 'sub/flag.txt']
+    assert (output / 'sub/c.txt').read_text(encoding='utf-8').startswith('中文维基百科')
+    assert (output / 'sub/flag.txt').read_text(encoding='utf-8') == '電腦电脑'
+
+    (pages / 'sub/bad.txt').unlink()
+    assert main(['-t', 'zh-tw', '-q', '-j', '1', '-o', str(output), str(pages / 'a.txt')]) == 0
+    assert (output / 'a.txt').read_text(encoding='utf-8').startswith('中文維基百科')
+
+
+def test_errors(tmp_path: Path, capsys: pytest.CaptureFixture[str]):
+    with pytest.raises(SystemExit):
+        main(['-t', 'xx-yy', 'a.txt'])
+    with pytest.raises(SystemExit):
+        main(['-t', 'zh-cn', str(tmp_path / 'missing.txt')])
+    with pytest.raises(SystemExit):
+        main(['-t', 'zh-cn', '--in-place', '-'])
+    assert 'missing.txt' in capsys.readouterr().err
@@ -1,5 +1,22 @@
-from langconv.converter import LanguageConverter
-from langconv.language.zh import zh_cn  # , zh_hk, zh_tw
+import asyncio
+import io
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from langconv import converter
+from langconv.converter import (
+    MAX_DIVERGENCE,
+    SECTION_LENGTH,
+    LanguageConverter,
+    LCMarkup,
+    convert_multi,
+    find_markup,
+)
+from langconv.language.zh import zh_cn, zh_hk, zh_tw
+from langconv.trie import Trie
 
 
 def test_convert_custom_rules():
@@ -67,3 +84,262 @@ def test_convert_special_characters():
     lc = LanguageConverter.from_language(zh_cn)
     assert lc.convert('-') == '-'
     assert lc.convert(' ') == ' '
+
+
+def test_convert_many():
+    lc = LanguageConverter.from_language(zh_cn)
+    texts = [
+        '-{H|電腦程式=>zh-cn:电脑程序;}-目的是以電腦程式適應不同用字模式的差異。',
+        '目的是以-{A|zh-hant: 電腦程式; zh-hans: 电脑程序;}-適應不同用字模式的差異。電腦程式',
+        '',
+    ] * 5
+    expected = [lc.convert(text, sequential_global=True) for text in texts]
+    assert lc.convert_many(texts, workers=2, chunksize=2, sequential_global=True) == expected
+    assert lc.convert_many(iter(texts), workers=1, sequential_global=True) == expected
+
+
+def test_iter_convert():
+    lc = LanguageConverter.from_language(zh_cn)
+    text = (
+        '中文維基百科繁簡處理是中文維基百科的自動轉換，目的是以-{A|zh-hant: 電腦程式; zh-hans: 电脑程序;}-'
+        '適應不同用字模式的差異。-{-|zh-hant: 電腦程式; zh-hans: 电脑程序;}-電腦程式-{R|-{\n}-'
+        '-{H|電腦程式=>zh-cn:电脑程序;}-電腦程式-\n-{簡體}--'
+    )
+    expected = lc.convert(text, sequential_global=True)
+    for size in (1, 2, 3, 7, 30, len(text)):
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert ''.join(lc.iter_convert(chunks)) == expected
+    assert not list(lc.iter_convert([]))
+
+
+def test_iter_convert_unclosed_markup(monkeypatch: pytest.MonkeyPatch):
+    lc = LanguageConverter.from_language(zh_cn)
+    for text in ('x-{abc', 'x-{ab電腦', 'x-{ -{H|電腦=>zh-cn:PC}-電腦', '-{a -{電腦}-'):
+        for size in (1, 2, len(text)):
+            chunks = [text[i : i + size] for i in range(0, len(text), size)]
+            assert ''.join(lc.iter_convert(chunks)) == lc.convert(text, sequential_global=True)
+
+    # The text of an unclosed block is only held back up to a limit
+    monkeypatch.setattr(converter, 'MAX_HELD_MARKUP', 100)
+    consumed: list[str] = []
+    chunks = ['電腦-{', *['電腦' * 10] * 20, '}-']
+    output = ''
+    for converted in lc.iter_convert(consumed.append(chunk) or chunk for chunk in chunks):
+        output += converted
+        assert len(''.join(consumed)) - len(output) <= 100 + 20 + SECTION_LENGTH
+    assert output == '电脑-{' + '电脑' * 200 + '}-'
+
+
+def test_convert_stream():
+    lc = LanguageConverter.from_language(zh_cn)
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        text = f.read()
+    writer = io.StringIO()
+    lc.convert_stream(io.StringIO(text), writer, chunk_size=100)
+    assert writer.getvalue() == lc.convert(text)
+
+
+def test_convert_without_markup():
+    lc = LanguageConverter.from_language(zh_cn)
+    text = '-{H|電腦程式=>zh-cn:电脑程序;}-電腦程式'
+    assert lc.convert(text, markup=False) == '-{H|计算机程序=>zh-cn:电脑程序;}-计算机程序'
+    assert ''.join(lc.iter_convert(text, markup=False)) == lc.convert(text, markup=False)
+    assert lc.convert('電腦程式') == lc.convert('電腦程式', markup=False)
+
+
+def test_unclosed_markup():
+    lc = LanguageConverter.from_language(zh_cn)
+    assert lc.convert('-{a -{電腦}-') == '-{a 電腦'
+    assert lc.convert('-{a -{電腦}-\nx') == '-{a 電腦\nx'
+    assert lc.convert('x-{abc') == 'x-{abc'
+    assert lc.convert('x-{ -{H|電腦=>zh-cn:PC}-電腦') == 'x-{ PC'
+
+
+def test_find_markup():
+    assert find_markup('a-{b}-c') == (1, 6)
+    assert find_markup('-{zh-hans:-{x}-;zh-hant:y}-z') == (0, 27)
+    assert find_markup('-{a -{b}-') == (0, -1)
+    assert find_markup('-{a -{b}-', final=True) == (4, 9)
+    assert find_markup('-{a -{b', final=True) == (-1, -1)
+    assert find_markup('-{a\n-{b}-') == (4, 9)
+    assert find_markup('-{a}-{b}-') == (0, 5)
+    assert find_markup('plain') == (-1, -1)
+
+
+def test_parse_markup():
+    text = 'x-{ H | zh-cn : 软件 ; zh-TW:-{軟;體}- }-'
+    markup = LCMarkup.parse(text, 1, len(text))
+    assert markup == LCMarkup(
+        LCMarkup.Flag.HIDDEN, LCMarkup.Omnidirectional({'zh-cn': '软件', 'zh-tw': '-{軟;體}-'})
+    )
+    assert LCMarkup.parse('-{a=>zh-cn:b;c}-').rule == LCMarkup.Unidirectional('a', {'zh-cn': 'b'})
+    assert LCMarkup.parse('-{R|a:b}-').rule == LCMarkup.Omnidirectional({'a': 'b'})
+    assert LCMarkup.parse('-{-{a:b}-}-') == LCMarkup(LCMarkup.Flag.RAW, LCMarkup.Raw('-{a:b}-'))
+    assert LCMarkup.parse('-{ }-') == LCMarkup(LCMarkup.Flag.EMPTY, LCMarkup.Empty())
+    # Unknown flags are dropped, like in MediaWiki
+    assert LCMarkup.parse('-{X|foo}-') == LCMarkup(LCMarkup.Flag.RAW, LCMarkup.Raw('foo'))
+    assert LCMarkup.parse('-{X|a:b}-') == LCMarkup(
+        LCMarkup.Flag.SHOW, LCMarkup.Omnidirectional({'a': 'b'})
+    )
+
+
+def test_convert_nested_markup():
+    lc = LanguageConverter.from_language(zh_cn)
+    assert lc.convert('-{zh-hans:-{軟件}-;zh-hant:軟體}-電腦') == '軟件电脑'
+    assert lc.convert('-{-{zh-hans:a;zh-hant:b}-c}-') == 'ac'
+
+
+def test_convert_incremental():
+    lc = LanguageConverter.from_language(zh_cn)
+    paragraphs = [
+        '中文維基百科繁簡處理是中文維基百科的自動轉換。',
+        '-{H|電腦程式=>zh-cn:电脑程序;}-目的是以電腦程式適應不同用字模式的差異。',
+        '目的是以-{A|zh-hant: 電腦; zh-hans: 电子计算机;}-適應不同用字模式的差異。電腦程式',
+        '-{-|zh-hant: 電腦; zh-hans: 电子计算机;}-電腦程式',
+        '電腦程式',
+    ]
+    for sequential_global in (False, True):
+        text = '\n'.join(paragraphs)
+        document = lc.convert_incremental(text, sequential_global=sequential_global)
+        assert document.text == lc.convert(text, sequential_global=sequential_global)
+
+        edited = text.replace('自動轉換', '轉換')
+        document = lc.convert_incremental(edited, document, sequential_global=sequential_global)
+        assert document.text == lc.convert(edited, sequential_global=sequential_global)
+        assert document.reused == len(paragraphs) - 1
+
+        edited = edited.replace('電腦程式=>zh-cn:电脑程序', '電腦程式=>zh-cn:计算机程序')
+        document = lc.convert_incremental(edited, document, sequential_global=sequential_global)
+        assert document.text == lc.convert(edited, sequential_global=sequential_global)
+
+
+def test_aconvert():
+    lc = LanguageConverter.from_language(zh_cn)
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    expected = [lc.convert(line) for line in lines]
+
+    async def convert_all(executor: Executor | None):
+        assert await lc.aconvert(lines[0], executor=executor) == expected[0]
+        assert await lc.aconvert(lines[0], executor=executor, inline_threshold=0) == expected[0]
+        assert await lc.aconvert_many(lines, executor=executor, chunksize=50, limit=2) == expected
+
+    asyncio.run(convert_all(None))
+    with ThreadPoolExecutor(2) as executor:
+        asyncio.run(convert_all(executor))
+    with lc.create_executor(2) as executor:
+        asyncio.run(convert_all(executor))
+
+
+def test_convert_layered_rules():
+    topic = Trie.from_dict({'程式': '程序', '電腦程式': '电脑程式'})
+    lc = LanguageConverter(zh_cn, [topic, zh_cn.rules])
+    assert lc.convert('電腦程式設計') == '电脑程式设计'
+    assert lc.convert('-{H|電腦程式=>zh-cn:计算机程序;}-電腦程式設計') == '计算机程序设计'
+    assert lc.convert('程式') == '程序'
+
+
+def test_convert_multi():
+    converters = [LanguageConverter.from_language(lang) for lang in (zh_cn, zh_tw, zh_hk)]
+    assert converters[1].get_divergence(converters[2]).ratio < MAX_DIVERGENCE
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        content = large_txt.read()
+    texts = [
+        content,
+        '-{H|zh-cn:软件; zh-tw:軟體; zh-hk:軟件}-' + content[:500],
+        '-{zh-hans:网络;zh-tw:網路;zh-hk:網絡}-網絡和網路-{R|网络}-' + content[:100],
+        '',
+    ]
+    for text in texts:
+        for sequential_global in (False, True):
+            results = convert_multi(
+                text, [zh_cn, zh_tw, zh_hk], sequential_global=sequential_global
+            )
+            assert results == {
+                lc.language.code: lc.convert(text, sequential_global=sequential_global)
+                for lc in converters
+            }
+    assert convert_multi('-{H|a=>zh-cn:b}-a', [zh_cn], markup=False) == {
+        'zh-cn': '-{H|a=>zh-cn:b}-a'
+    }
+    assert convert_multi('a', []) == {}
+
+
+def test_convert_html():
+    lc = LanguageConverter.from_language(zh_cn)
+    cases = {
+        '<p title="電腦">電腦</p>': '<p title="電腦">电脑</p>',
+        '電<b>腦</b>': '电<b>脑</b>',
+        '<PRE>電腦</pre>電腦<code class="x">電腦</CODE>': '<PRE>電腦</pre>电脑<code class="x">電腦</CODE>',
+        '<!-- 電腦 -->電腦<script>a="電腦";</script>': '<!-- 電腦 -->电脑<script>a="電腦";</script>',
+        'a < b 電腦<br/>電腦<pre/>電腦': 'a < b 电脑<br/>电脑<pre/>电脑',
+        '<a title="-{電腦}-電腦">電腦</a>': '<a title="電腦電腦">电脑</a>',
+        '<pre>-{H|電腦=>zh-cn:PC}-電腦</pre>電腦': '<pre>電腦</pre>PC',
+        '<p 電腦': '<p 電腦',
+        '<a title="電腦>電腦" b=\'>\' c = ">">電腦</a>': '<a title="電腦>電腦" b=\'>\' c = ">">电脑</a>',
+        '<a title=電腦 x="">電腦': '<a title=電腦 x="">电脑',
+        '<a title=-{x}-"電腦>電腦">電腦</a>': '<a title=x"電腦>電腦">电脑</a>',
+        '<script>電腦</scriptx>電腦</script >電腦': '<script>電腦</scriptx>電腦</script >电脑',
+    }
+    for text, expected in cases.items():
+        assert lc.convert(text, avoid_html_code=True) == expected
+        for size in range(1, 4):
+            chunks = [text[i : i + size] for i in range(0, len(text), size)]
+            assert ''.join(lc.iter_convert(chunks, avoid_html_code=True)) == expected
+    assert lc.convert('<p>電腦</p>') == '<p>电脑</p>'
+
+
+def test_translate_text():
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        text = f.read()[:5000]
+    for language in (zh_cn, zh_tw, zh_hk):
+        lc = LanguageConverter.from_language(language)
+        page = Trie.from_dict(
+            {'中文': '華文', '的': '之', **{f'{i}年': f'{i}載' for i in range(99)}}
+        )
+        for table in (lc.get_table(), lc.get_table().overlay(page.compile())):
+            # Converting one position at a time does not use `str.translate`
+            expected: list[str] = []
+            i = 0
+            while i < len(text):
+                i = lc.convert_text(text, table, expected, i, stop=i + 1)
+            output: list[str] = []
+            assert lc.translate_text(text, table, output, stop=len(text), end=len(text)) == i
+            assert ''.join(output) == ''.join(expected)
+
+
+def test_match():
+    lc = LanguageConverter.from_language(zh_cn)
+    assert lc.match('使用電腦程式', 2) == (4, '计算机程序')
+    assert lc.match('使用電腦程式', 0) is None
+
+
+def test_convert_threads():
+    lc = LanguageConverter.from_language(zh_tw)
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    documents = [f'-{{H|zh-cn:软件; zh-tw:軟體}}-{line}软件' for line in lines]
+    expected = [lc.convert(document, sequential_global=True) for document in documents]
+    with ThreadPoolExecutor(8) as executor:
+        results = executor.map(partial(lc.convert, sequential_global=True), documents)
+        assert list(results) == expected
+
+    # Rules modified during conversion apply to whole conversions
+    topic = Trie()
+    lc = LanguageConverter(zh_tw, [topic, zh_tw.rules])
+    stop = threading.Event()
+
+    def modify():
+        while not stop.is_set():
+            topic.insert('中文', '華文')
+            topic.delete('中文')
+
+    writer = threading.Thread(target=modify)
+    writer.start()
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            results = executor.map(lc.convert, ['中文和中文'] * 2000)
+            assert set(results) <= {'中文和中文', '華文和華文'}
+    finally:
+        stop.set()
+        writer.join()
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+from langconv.converter import LanguageConverter, convert_multi
+from langconv.group import ConversionGroup
+from langconv.language.zh import zh_cn, zh_hk, zh_tw
+
+it = ConversionGroup.from_dict(
+    {
+        'name': 'IT',
+        'rules': [
+            'zh-cn:字节; zh-tw:位元組',
+            {'zh-CN': '内存', 'zh-tw': '記憶體'},
+            '程式=>zh-cn:程序',
+        ],
+    }
+)
+
+
+def test_compile():
+    assert dict(it.compile(zh_cn).table) == {
+        '字节': '字节',
+        '位元組': '字节',
+        '内存': '内存',
+        '記憶體': '内存',
+        '程式': '程序',
+    }
+    assert it.compile(zh_cn) is it.compile(zh_cn)
+    assert it.compile(zh_tw)['字节'] == '位元組'
+
+
+def test_from_markup():
+    page = '-{H|zh-cn:字节; zh-tw:位元組}-\n* -{A|程式=>zh-cn:程序}-\n-{R|ignored}- text'
+    group = ConversionGroup.from_markup('IT', page)
+    assert group.rules == it.rules[::2]
+
+
+def test_from_json_file(tmp_path: Path):
+    path = tmp_path / 'it.json'
+    path.write_text(json.dumps({'name': 'IT', 'rules': ['zh-cn:字节; zh-tw:位元組']}))
+    group = ConversionGroup.from_json_file(str(path))
+    assert (group.name, group.rules) == ('IT', it.rules[:1])
+
+
+def test_convert_with_group():
+    lc = LanguageConverter.from_language(zh_tw, groups={'IT': it})
+    assert lc.convert('字节和内存-{G|IT}-') == '位元組和記憶體'
+    assert lc.convert('字节-{G|IT}-', sequential_global=True) == '字節'
+    assert lc.convert('-{G|IT}-字节', sequential_global=True) == '位元組'
+    assert lc.convert('-{G|Unknown; IT}-字节') == '位元組'
+    # Rules of the document take precedence
+    assert lc.convert('-{H|zh-cn:字节; zh-tw:位元}--{G|IT}-字节') == '位元'
+    assert ''.join(lc.iter_convert(['-{G|I', 'T}-字', '节'])) == '位元組'
+    hk = LanguageConverter.from_language(zh_hk)
+    assert convert_multi('-{G|IT}-字节', [lc, hk]) == {'zh-tw': '位元組', 'zh-hk': '字節'}
+
+
+def test_convert_incremental_with_group():
+    lc = LanguageConverter.from_language(zh_tw, groups={'IT': it})
+    text = '-{G|IT}-\n字节\n'
+    first = lc.convert_incremental(text)
+    assert first.text == '\n位元組\n'
+    lc.groups['IT'] = ConversionGroup('IT', [])
+    second = lc.convert_incremental(text, first)
+    assert (second.text, second.reused) == ('\n字節\n', 0)
@@ -1,21 +1,505 @@
-import cProfile
-from typing import Callable, ParamSpec, Protocol
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from multiprocessing.queues import SimpleQueue
+from multiprocessing.synchronize import Barrier
+from pathlib import Path
+from typing import ParamSpec, Protocol, TypeVar
 
 import pytest
 
-from langconv.converter import LanguageConverter
-from langconv.language.zh import zh_cn
+import langconv.language as language_module
+from langconv.converter import LanguageConverter, convert_multi
+from langconv.group import ConversionGroup
+from langconv.language import Language, get_data_file_path, get_language, load_json_file, zh
+from langconv.language.zh import zh_cn, zh_hk, zh_tw
+from langconv.stats import ConversionStats
+from langconv.table import dump_table, source_digest
+from langconv.trie import NUMPY_MIN_LENGTH, CharTable, Trie
 
 P = ParamSpec('P')
+R = TypeVar('R')
 
 
 class Benchmark(Protocol):
-    def __call__(self, func: Callable[P, object], *args: P.args, **kwargs: P.kwargs): ...
+    extra_info: dict[str, object]
+
+    def __call__(self, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R: ...
+
+    def pedantic(
+        self, func: Callable[..., object], args: tuple[object, ...], *, rounds: int
+    ) -> object: ...
+
+
+VARIANTS = ['zh-cn', 'zh-tw', 'zh-hk']
+
+
+def read_corpus(repeat: int = 1) -> str:
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        return large_txt.read() * repeat
+
+
+def load_language(code: str, table_file: str | None, *, in_place: bool = False) -> Language:
+    files, fallbacks = zh._variants[code]  # pyright: ignore[reportPrivateUsage]
+    return Language.from_json_files(
+        code, [get_data_file_path(file) for file in files], fallbacks, table_file, in_place=in_place
+    )
+
+
+def build_table(code: str, directory: Path) -> str:
+    """Compiles the binary table of a variant into ``directory``, like `zh.build_tables` does into
+    the cache directory."""
+    files, _ = zh._variants[code]  # pyright: ignore[reportPrivateUsage]
+    path = str(directory / f'{code}.bin')
+    digest = source_digest([get_data_file_path(file) for file in files])
+    dump_table(get_language(code).rules.compile(), path, digest)
+    return path
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_convert(benchmark: Benchmark, code: str):
+    lc = LanguageConverter.from_language(get_language(code))
+    content = read_corpus(5)
+    benchmark.extra_info['bytes'] = len(content.encode())
+    benchmark(lc.convert, content)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    'statement',
+    [
+        'import langconv.language.zh',
+        'from langconv.language.zh import zh_cn',
+        'from langconv.language.zh import zh_tw',
+        'from langconv.language.zh import zh_hk',
+        'from langconv.language.zh import zh_cn, zh_hk, zh_tw',
+    ],
+)
+def test_perf_import(benchmark: Benchmark, statement: str):
+    benchmark(subprocess.run, [sys.executable, '-c', statement], check=True)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('binary', [False, True], ids=['json', 'binary'])
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_load(
+    benchmark: Benchmark, monkeypatch: pytest.MonkeyPatch, tmp_path: Path, code: str, binary: bool
+):
+    table_file = None
+    if binary:
+        table_file = build_table(code, tmp_path)
+
+        # Fails if the JSON files are loaded instead, e.g. as the table is out of date
+        def fail(file: str) -> dict[str, str]:
+            raise AssertionError(f'{file} was loaded instead of {table_file}')
+
+        monkeypatch.setattr(language_module, 'load_json_file', fail)
+    benchmark(load_language, code, table_file)
+
+
+def build_trie(code: str) -> int:
+    files, _ = zh._variants[code]  # pyright: ignore[reportPrivateUsage]
+    content: dict[str, str] = {}
+    for file in files:
+        content |= load_json_file(get_data_file_path(file))
+    tracemalloc.start()
+    trie = Trie.from_dict(content)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del trie
+    return size
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_memory(benchmark: Benchmark, code: str):
+    tracemalloc.start()
+    language = load_language(code, None)
+    LanguageConverter.from_language(language).convert('')
+    benchmark.extra_info['language_bytes'], benchmark.extra_info['peak_bytes'] = (
+        tracemalloc.get_traced_memory()
+    )
+    tracemalloc.stop()
+    del language
+    benchmark.extra_info['trie_bytes'] = build_trie(code)
+    benchmark(build_trie, code)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_perf_convert_many(benchmark: Benchmark, workers: int):
+    lc = LanguageConverter.from_language(zh_cn)
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        lines = large_txt.read().splitlines() * 50
+    benchmark(lc.convert_many, lines, workers=workers)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('markup', [True, False])
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_short_strings(benchmark: Benchmark, code: str, markup: bool):
+    lc = LanguageConverter.from_language(get_language(code))
+    lines = read_corpus().splitlines()
+
+    def convert_lines():
+        for line in lines:
+            lc.convert(line, markup=markup)
+
+    benchmark.extra_info['strings'] = len(lines)
+    benchmark(convert_lines)
+
+
+def build_markup_page(text: str) -> str:
+    rules = [
+        '-{H|zh-cn:软件; zh-tw:軟體; zh-hk:軟件}-',
+        '-{A|zh-hans:内存; zh-hant:記憶體}-',
+        '-{zh-hans:网络; zh-tw:網路; zh-hk:網絡}-',
+        '-{R|原文}-',
+        '-{-|zh-cn:软件; zh-tw:軟體; zh-hk:軟件}-',
+    ]
+    parts: list[str] = []
+    for i, sentence in enumerate(text.split('。')):
+        parts.append(sentence)
+        parts.append(rules[i % len(rules)])
+    return '。'.join(parts)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('sequential_global', [False, True], ids=['global', 'sequential'])
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_markup_page(benchmark: Benchmark, code: str, sequential_global: bool):
+    lc = LanguageConverter.from_language(get_language(code))
+    page = build_markup_page(read_corpus())
+    benchmark.extra_info['blocks'] = page.count('-{')
+    benchmark(lc.convert, page, sequential_global=sequential_global)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('sequential_global', [False, True], ids=['global', 'sequential'])
+@pytest.mark.parametrize('rules', [1000, 3000])
+def test_perf_many_rules(benchmark: Benchmark, rules: int, sequential_global: bool):
+    lc = LanguageConverter.from_language(zh_tw)
+    page = ''.join(f'-{{H|zh-cn:术语{i}; zh-tw:術語{i}}}-這是一段文字內容{i}' for i in range(rules))
+    assert lc.convert(page + '术语42', sequential_global=sequential_global).endswith('術語42')
+    benchmark(lc.convert, page, sequential_global=sequential_global)
 
 
 @pytest.mark.slow
-def test_perf(benchmark: Benchmark):
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_trie_churn(benchmark: Benchmark, code: str):
+    items = list(islice(get_language(code).rules.items(), 1000))
+
+    def churn():
+        trie = Trie()
+        for key, value in items:
+            trie.insert(key, value)
+        for key, _ in items:
+            trie.delete(key)
+
+    benchmark(churn)
+
+
+@pytest.mark.slow
+def test_perf_convert_incremental(benchmark: Benchmark):
     lc = LanguageConverter.from_language(zh_cn)
     with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
         content = large_txt.read() * 5
-        benchmark(cProfile.runctx, 'lc.convert(content)', {}, locals(), 'stats.prof')
+    document = lc.convert_incremental(content)
+    edited = content.replace('標點符號', '標點', 1)
+    benchmark(lc.convert_incremental, edited, document)
+
+
+async def convert_with_lag(lc: LanguageConverter, texts: list[str], inline_threshold: int):
+    """Converts texts with `aconvert` while measuring how late the event loop wakes up."""
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def tick():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    ticker = asyncio.ensure_future(tick())
+    for text in texts:
+        await lc.aconvert(text, inline_threshold=inline_threshold)
+        await asyncio.sleep(0)
+    done.set()
+    await ticker
+    return lags
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('inline_threshold', [1 << 30, 0], ids=['inline', 'executor'])
+def test_perf_aconvert_lag(benchmark: Benchmark, inline_threshold: int):
+    lc = LanguageConverter.from_language(zh_cn)
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        texts = [large_txt.read() * 5] * 5
+    lags = sorted(benchmark(lambda: asyncio.run(convert_with_lag(lc, texts, inline_threshold))))
+    benchmark.extra_info['p99_lag_ms'] = lags[int(len(lags) * 0.99)] * 1000
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('topics', [0, 1, 30])
+def test_perf_layered_rules(benchmark: Benchmark, topics: int):
+    rules = [
+        Trie.from_dict({f'詞彙{i}{j}': f'词汇{i}{j}' for j in range(100)}) for i in range(topics)
+    ]
+    lc = LanguageConverter(zh_cn, [*rules, zh_cn.rules])
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        content = large_txt.read() * 5
+    benchmark(lc.convert, content)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('use_group', [False, True], ids=['inline', 'group'])
+def test_perf_group_rules(benchmark: Benchmark, use_group: bool):
+    rules = ''.join(f'-{{H|zh-cn:术语{i}; zh-tw:術語{i}}}-' for i in range(500))
+    group = ConversionGroup.from_markup('Glossary', rules)
+    lc = LanguageConverter.from_language(zh_tw, groups={group.name: group})
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        body = large_txt.read()[:2000]
+    page = ('-{G|Glossary}-' if use_group else rules) + body
+    assert lc.convert(page + '术语42') == lc.convert(rules + body + '术语42')
+    benchmark(lc.convert, page)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('method', ['divide', 'convert'])
+def test_perf_parse_markup(benchmark: Benchmark, method: str):
+    blocks = [
+        '-{A|zh-hans:软件; zh-hant:軟體}-',
+        '-{H|程式=>zh-cn:程序; zh-sg:程序}-',
+        '-{zh-hans:-{内存}-; zh-hant:記憶體}-',
+        '-{R|raw}-',
+    ]
+    page = '文字'.join(blocks[i % len(blocks)] for i in range(5000))
+    lc = LanguageConverter.from_language(zh_cn)
+    assert len(lc.divide(page)) == 2 * 5000
+    benchmark(getattr(lc, method), page)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('multi', [False, True], ids=['separate', 'multi'])
+def test_perf_convert_multi(benchmark: Benchmark, multi: bool):
+    languages = [zh_cn, zh_tw, zh_hk]
+    converters = [LanguageConverter.from_language(language) for language in languages]
+    with open('tests/zh_cn.txt', encoding='utf-8') as large_txt:
+        content = large_txt.read() * 5
+    convert_multi('', converters)  # Compare the tables up front
+    if multi:
+        benchmark(convert_multi, content, converters)
+    else:
+        benchmark(lambda: {lc.language.code: lc.convert(content) for lc in converters})
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('codes', [['zh-tw', 'zh-hk'], VARIANTS], ids=['pair', 'all'])
+def test_perf_convert_multi_paired(benchmark: Benchmark, codes: list[str]):
+    converters = [LanguageConverter.from_language(get_language(code)) for code in codes]
+    content = read_corpus(5)
+
+    def separate() -> dict[str, str]:
+        return {lc.language.code: lc.convert(content) for lc in converters}
+
+    assert convert_multi(content, converters) == separate()
+    paired = min(timeit.repeat(lambda: convert_multi(content, converters), number=1, repeat=20))
+    ratio = paired / min(timeit.repeat(separate, number=1, repeat=20))
+    benchmark.extra_info['paired_ratio'] = ratio
+    if codes == ['zh-tw', 'zh-hk']:
+        # Only zh-tw and zh-hk share a table, so three variants gain no more than the pair. The
+        # margin leaves room for noisy machines
+        assert ratio < 1.1  # noqa: PLR2004
+    benchmark(convert_multi, content, converters)
+
+
+def build_html(text: str) -> str:
+    parts: list[str] = []
+    for i, paragraph in enumerate(text.split('\n')):
+        if not i % 7:
+            parts.append(f'<pre class="code">{paragraph[:80]}</pre>')
+        elif i % 5 == 1:
+            parts.append(f'<script>var s = "{paragraph[:40]}";</script>')
+        half = len(paragraph) // 2
+        parts.append(
+            f'<p id="p{i}" title="{paragraph[:10]}">{paragraph[:half]}'
+            f'<a href="/wiki/{paragraph[half : half + 4]}">{paragraph[half : half + 8]}</a>'
+            f'{paragraph[half + 8 :]}</p><!-- {paragraph[:5]} -->\n'
+        )
+    return ''.join(parts)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('html', [False, True], ids=['text', 'html'])
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_html(benchmark: Benchmark, code: str, html: bool):
+    lc = LanguageConverter.from_language(get_language(code))
+    content = read_corpus(5)
+    if html:
+        content = build_html(content)
+    benchmark.extra_info['bytes'] = len(content.encode())
+    benchmark(lc.convert, content, avoid_html_code=html, markup=False)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('enabled', [False, True], ids=['off', 'on'])
+def test_perf_stats(benchmark: Benchmark, enabled: bool):
+    stats = ConversionStats() if enabled else None
+    lc = LanguageConverter.from_language(zh_cn, stats=stats)
+    content = read_corpus(5)
+    benchmark(lc.convert, content)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_char_table(benchmark: Benchmark, code: str):
+    table = LanguageConverter.from_language(get_language(code)).get_table()
+    benchmark(CharTable.from_table, table)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_allocations(benchmark: Benchmark, code: str):
+    lc = LanguageConverter.from_language(get_language(code))
+    content = read_corpus(5)
+    output: list[str] = []
+    lc.convert_text(content, lc.get_table(), output)
+    tracemalloc.start()
+    lc.convert(content, markup=False)
+    benchmark.extra_info['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    benchmark.extra_info['output_pieces'] = len(output)
+    benchmark(lc.convert, content, markup=False)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('threads', [1, 2, 4, 8])
+def test_perf_threads(benchmark: Benchmark, threads: int):
+    # Scales with threads on free-threaded Python only
+    lc = LanguageConverter.from_language(zh_tw)
+    content = read_corpus(4)
+    documents = [content[i : i + 4096] for i in range(0, len(content), 4096)]
+
+    def convert_documents():
+        with ThreadPoolExecutor(threads) as executor:
+            return list(executor.map(lc.convert, documents))
+
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)
+    benchmark.extra_info['gil'] = is_gil_enabled()
+    benchmark.extra_info['bytes'] = len(content.encode())
+    benchmark(convert_documents)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_cli(benchmark: Benchmark, code: str):
+    # Includes the cold start: starting Python, importing langconv and loading the tables
+    benchmark(
+        subprocess.run,
+        [
+            sys.executable,
+            '-m',
+            'langconv',
+            '--to',
+            code,
+            '-q',
+            '-o',
+            '/dev/null',
+            'tests/zh_cn.txt',
+        ],
+        check=True,
+    )
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('bulk', [False, True], ids=['single', 'bulk'])
+def test_perf_reload(benchmark: Benchmark, bulk: bool):
+    # Replaces 10k editorial rules layered on a large table, and converts with the new rules
+    keys = list(islice(zh_tw.rules.compile().table, 10_000))
+    versions = [{key: f'{key}{version}' for key in keys} for version in range(2)]
+    editorial = Trie.from_dict(versions[0])
+    lc = LanguageConverter(zh_tw, [editorial, zh_tw.rules])
+    lc.convert(keys[0])
+    reloads = iter(range(1, 1 << 30))
+
+    def reload():
+        new = versions[next(reloads) % 2]
+        if bulk:
+            editorial.remove_many(keys)
+            editorial.update(new)
+        else:
+            for key in keys:
+                editorial.delete(key)
+            for key, value in new.items():
+                editorial.insert(key, value)
+        return lc.convert(keys[0])
+
+    benchmark(reload)
+
+
+def measure_worker_pss(
+    code: str, table_file: str, in_place: bool, barrier: Barrier, results: SimpleQueue[int]
+) -> None:
+    # Like a worker of a prefork server, loading the tables after the fork
+    lc = LanguageConverter.from_language(load_language(code, table_file, in_place=in_place))
+    lc.convert(read_corpus())
+    barrier.wait()
+    with open('/proc/self/smaps_rollup', encoding='ascii') as f:
+        results.put(next(int(line.split()[1]) << 10 for line in f if line.startswith('Pss:')))
+    barrier.wait()
+
+
+def measure_pss(code: str, table_file: str, in_place: bool, workers: int) -> int:
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    results: SimpleQueue[int] = context.SimpleQueue()
+    args = (code, table_file, in_place, barrier, results)
+    processes = [context.Process(target=measure_worker_pss, args=args) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'), reason='Linux only')
+@pytest.mark.parametrize('workers', [1, 8, 32])
+@pytest.mark.parametrize('in_place', [False, True], ids=['dict', 'in_place'])
+def test_perf_workers_memory(benchmark: Benchmark, tmp_path: Path, in_place: bool, workers: int):
+    # The proportional set size counts the pages shared by the workers once in total
+    table_file = build_table('zh-tw', tmp_path)
+    benchmark.extra_info['pss_bytes'] = measure_pss('zh-tw', table_file, in_place, workers)
+    benchmark(measure_pss, 'zh-tw', table_file, in_place, workers)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+@pytest.mark.parametrize('code', VARIANTS)
+def test_perf_numpy(benchmark: Benchmark, monkeypatch: pytest.MonkeyPatch, code: str, backend: str):
+    # Candidate positions found with NumPy, against the regular expression, on 100 MB of text
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    size = len(read_corpus().encode())
+    content = read_corpus(-(-100_000_000 // size))
+    lc = LanguageConverter.from_language(get_language(code))
+    monkeypatch.setattr('langconv.trie.NUMPY_MIN_LENGTH', sys.maxsize)
+    expected = hashlib.sha256(lc.convert(content).encode()).digest()
+    monkeypatch.setattr(
+        'langconv.trie.NUMPY_MIN_LENGTH', NUMPY_MIN_LENGTH if backend == 'numpy' else sys.maxsize
+    )
+    benchmark.extra_info['bytes'] = len(content.encode())
+    result = benchmark.pedantic(lc.convert, (content,), rounds=1)
+    assert isinstance(result, str)
+    assert hashlib.sha256(result.encode()).digest() == expected
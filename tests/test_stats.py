@@ -0,0 +1,58 @@
+import pickle
+
+from langconv.cache import ConversionCache
+from langconv.converter import LanguageConverter
+from langconv.language import Language
+from langconv.stats import PHASES, ConversionStats
+from langconv.trie import Trie
+
+
+def test_counters():
+    language = Language('zh-cn', Trie.from_dict({'電腦': '电脑', '程': '程'}), ['zh-hans'])
+    stats = ConversionStats()
+    lc = LanguageConverter.from_language(language, stats=stats)
+    assert lc.convert('電腦程式') == '电脑程式'
+    assert (stats.documents, stats.chars, stats.matches, stats.misses) == (1, 4, 2, 1)
+    assert stats.hit_rate == 2 / 3
+    stats.clear()
+    assert lc.convert('XX電腦程式' * 4) == 'XX电脑程式' * 4
+    assert (stats.chars, stats.matches, stats.misses) == (24, 8, 12)
+    stats.clear()
+
+    text = '-{H|程式=>zh-cn:程序;}--{A|zh-hans:软件; zh-hant:軟體}-程式-{-|程式=>zh-cn:程序;}-程式'
+    assert lc.convert(text, sequential_global=True) == '软件程序程式'
+    assert stats.markup == {'H': 1, 'A': 1, '-': 1}
+    assert (stats.rules_inserted, stats.rules_deleted) == (3, 1)
+    assert stats.documents == 1
+    assert stats.as_dict()['markup'] == {'H': 1, 'A': 1, '-': 1}
+
+    stats.clear()
+    assert stats.as_dict() == ConversionStats().as_dict()
+
+
+def test_callback():
+    calls: list[dict[str, float]] = []
+    stats = ConversionStats(callback=lambda _, timings: calls.append(timings))
+    language = Language('zh-cn', Trie.from_dict({'電腦': '电脑'}), ['zh-hans'])
+    lc = LanguageConverter.from_language(language, stats=stats)
+    lc.convert('電腦')
+    lc.convert('-{R|電腦}-電腦')
+    assert len(calls) == stats.documents == 2  # noqa: PLR2004
+    assert all(tuple(timings) == PHASES for timings in calls)
+    assert calls[0]['divide'] == 0
+    assert stats.timings['convert'] >= calls[0]['convert'] > 0
+
+    copy = pickle.loads(pickle.dumps(lc))  # noqa: S301
+    assert copy.stats is not None
+    assert copy.stats.callback is None
+    assert copy.stats.documents == 0
+    assert copy.convert('電腦') == '电脑'
+
+
+def test_cache_hits_not_recorded():
+    stats = ConversionStats()
+    cache = ConversionCache()
+    language = Language('zh-cn', Trie.from_dict({'電腦': '电脑'}), ['zh-hans'])
+    lc = LanguageConverter.from_language(language, cache=cache, stats=stats)
+    assert lc.convert('電腦') == lc.convert('電腦') == '电脑'
+    assert (stats.documents, cache.hits) == (1, 1)
@@ -0,0 +1,89 @@
+import pickle
+from pathlib import Path
+
+import pytest
+
+from langconv.converter import LanguageConverter
+from langconv.language import Language, get_data_file_path
+from langconv.table import MappedTable, dump_table, get_cache_path, load_table, source_digest
+from langconv.trie import Trie
+
+
+def test_dump_and_load(tmp_path: Path):
+    compiled = Trie.from_dict(
+        {'hello': 'world', 'hey': 'there', '电脑': '計算機', '电': '電'}
+    ).compile()
+    path = str(tmp_path / 'table.bin')
+    dump_table(compiled, path, b'\0' * 32)
+    loaded = load_table(path, b'\0' * 32)
+    assert loaded is not None
+    assert loaded == compiled
+    assert loaded.match('电脑程序') == (2, '計算機')
+
+
+def test_load_stale_or_missing(tmp_path: Path):
+    path = str(tmp_path / 'table.bin')
+    assert load_table(path) is None
+    dump_table(Trie.from_dict({'a': 'b'}).compile(), path, b'\0' * 32)
+    assert load_table(path, b'\1' * 32) is None
+    Path(path).write_bytes(b'')
+    assert load_table(path) is None
+
+
+def test_load_from_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('LANGCONV_CACHE_DIR', str(tmp_path))
+    path = get_data_file_path('zh/missing.bin')
+    assert get_cache_path(path) == str(tmp_path / 'zh' / 'missing.bin')
+    assert get_cache_path(str(tmp_path / 'table.bin')) is None
+    assert load_table(path) is None
+
+    (tmp_path / 'zh').mkdir()
+    compiled = Trie.from_dict({'电脑': '計算機'}).compile()
+    dump_table(compiled, str(tmp_path / 'zh' / 'missing.bin'), b'\0' * 32)
+    assert load_table(path, b'\0' * 32) == compiled
+    assert load_table(path, b'\1' * 32) is None
+
+
+def test_language_from_table_file(tmp_path: Path, caplog: pytest.LogCaptureFixture):
+    source = tmp_path / 'table.json'
+    source.write_text('{"电脑": "計算機"}', encoding='utf-8')
+    path = str(tmp_path / 'table.bin')
+    dump_table(Trie.from_dict({'电脑': '電腦'}).compile(), path, source_digest([str(source)]))
+
+    language = Language.from_json_files('zh-tw', [str(source)], [], path)
+    assert language.rules['电脑'] == '電腦'
+
+    source.write_text('{"电脑": "計算機", "电": "電"}', encoding='utf-8')
+    language = Language.from_json_files('zh-tw', [str(source)], [], path)
+    assert language.rules['电脑'] == '計算機'
+    assert not caplog.records
+
+    language = Language.from_json_files('zh-tw', [str(source)], [], None, in_place=True)
+    assert not caplog.records
+    language = Language.from_json_files('zh-tw', [str(source)], [], path, in_place=True)
+    assert language.rules['电脑'] == '計算機'
+    assert 'cannot be read in place' in caplog.text
+
+
+def test_load_in_place(tmp_path: Path):
+    dictionary = {'hello': 'world', 'hey': 'there', '电脑': '計算機', '电': '電', '𠮷': '吉'}
+    compiled = Trie.from_dict(dictionary).compile()
+    path = str(tmp_path / 'table.bin')
+    dump_table(compiled, path, b'\0' * 32)
+    loaded = load_table(path, b'\0' * 32, in_place=True)
+    assert loaded is not None
+    assert isinstance(loaded.table, MappedTable)
+    assert loaded == compiled
+    assert loaded.match('电脑程序') == (2, '計算機')
+    assert loaded['𠮷'] == '吉'
+    assert loaded['he'] is None
+    assert '\ud800' not in loaded
+    assert sorted(loaded.table) == sorted(dictionary)
+
+    copy = pickle.loads(pickle.dumps(loaded))  # noqa: S301
+    assert isinstance(copy.table, MappedTable)
+    assert copy == compiled
+
+    language = Language('zh-cn', Trie.from_compiled(loaded), [])
+    lc = LanguageConverter.from_language(language)
+    assert lc.convert('hello, 电脑 -{H|hey=>zh-cn:hi;}-hey') == 'world, 計算機 hi'
@@ -1,6 +1,12 @@
 import json
+import weakref
 
-from langconv.trie import Trie
+import pytest
+
+import langconv.trie as trie_module
+from langconv.converter import LanguageConverter
+from langconv.language.zh import zh_cn, zh_tw
+from langconv.trie import CompiledTrie, LayeredTrie, RuleLayer, Trie
 
 # pyright: reportOptionalMemberAccess=false
 
@@ -89,6 +95,39 @@ def test_delete():
     assert trie.search('carrot') is None
 
 
+def test_delete_keeps_other_keys():
+    trie = Trie.from_dict({'a': '1', 'ab': '2', 'abc': '3', 'abd': '4', 'b': '5'})
+    trie.delete('ab')
+    assert dict(trie.items()) == {'a': '1', 'abc': '3', 'abd': '4', 'b': '5'}
+    assert 'ab' not in trie
+    trie.delete('abc')
+    trie.delete('abd')
+    assert dict(trie.items()) == {'a': '1', 'b': '5'}
+    assert trie.search('ab') is None
+    trie.delete('zz')
+    trie.delete('a')
+    assert dict(trie.items()) == {'b': '5'}
+    trie.delete('b')
+    assert trie.root.children is None
+
+
+def test_update_and_remove_many():
+    trie = Trie.from_dict({'hello': 'world', 'hey': 'there', 'hi': 'everyone'})
+    compiled = trie.compile()
+    trie.update({'hello': 'you', 'howdy': 'partner', 'h': 'x'})
+    trie.remove_many(['hey', 'hi', 'missing'])
+    assert trie.compile() == CompiledTrie.from_dict({'hello': 'you', 'howdy': 'partner', 'h': 'x'})
+    assert compiled.match('hey') == (3, 'there')
+    trie.remove_many(['hello', 'howdy', 'h'])
+    assert trie.compile() == CompiledTrie.from_dict({})
+
+    compiled = CompiledTrie.from_dict({'ab': '1', 'abc': '2', 'b': '3'})
+    assert compiled.update({'abc': '', 'bcd': '4', 'b': ''}) == CompiledTrie.from_dict(
+        {'ab': '1', 'bcd': '4'}
+    )
+    assert compiled.update({}) == compiled
+
+
 def test_insert_overwrite():
     trie = Trie()
     trie.insert('hello', 'world')
@@ -120,6 +159,8 @@ def test_longest_prefix():
     assert trie.longest_prefix('hello world').value == 'world'
     assert trie.longest_prefix('hey there!').value == 'there'
     assert trie.longest_prefix('not in trie') is None
+    assert trie.match('say hello world', 4) == (5, 'world')
+    assert trie.match('say hello world', 4, 8) is None
 
 
 def test_load_large_json():
@@ -131,3 +172,140 @@ def test_load_large_json():
             ).value
             == '維'
         )
+
+
+def test_compile():
+    trie = Trie.from_dict({'hello': 'world', 'hello www': 'w', 'hey': 'there', 'he': ''})
+    compiled = trie.compile()
+    assert compiled.match('hello world') == (5, 'world')
+    assert compiled.match('say hello www', 4) == (9, 'w')
+    assert compiled.match('say hello www', 4, 10) == (5, 'world')
+    assert compiled.match('he') is None
+    assert compiled.longest_prefix('hey there!') == ('hey', 'there')
+    assert compiled.longest_prefix('not in trie') is None
+    assert compiled.max_length == len('hello www')
+    assert trie.compile() is compiled
+    trie.insert('h', 'x')
+    assert trie.compile() is not compiled
+    assert trie.compile().match('hi') == (1, 'x')
+
+
+def test_compiled_matches_trie():
+    with open('langconv/data/zh/hant.json', encoding='utf-8') as f:
+        trie = Trie.from_dict(json.load(f))
+    compiled = trie.compile()
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        text = f.read()
+    for i in range(len(text)):
+        node = trie.longest_prefix(text[i : i + 29])
+        expected = None if node is None else (node.length, node.value)
+        assert compiled.match(text, i) == expected
+        assert trie.match(text, i, i + 29) == expected
+
+
+def test_from_compiled():
+    compiled = Trie.from_dict({'hello': 'world', 'hey': 'there'}).compile()
+    trie = Trie.from_compiled(compiled)
+    assert trie.compile() is compiled
+    # Lookups use the compiled table until nodes are needed
+    assert trie['hey'] == 'there'
+    assert 'he' not in trie
+    assert trie.match('hello!') == (5, 'world')
+    assert trie.match('hello', 5) is None
+    assert dict(trie.items()) == {'hello': 'world', 'hey': 'there'}
+    assert trie._root is None  # pyright: ignore[reportPrivateUsage]
+    assert trie.search('hey').value == 'there'
+    assert trie.compile() is compiled
+    trie.insert('hi', 'everyone')
+    assert trie.compile().match('hi') == (2, 'everyone')
+
+
+def test_layered_trie():
+    base = Trie.from_dict({'hello': 'world', 'hey': 'there', 'hi': 'everyone'}).compile()
+    topic = Trie.from_dict({'hey': 'you', 'hello world': 'hi'}).compile()
+    page = Trie.from_dict({'h': 'H'}).compile()
+    layered = LayeredTrie.from_tries([page, topic, base])
+    assert layered['hey'] == 'you'
+    assert layered['hi'] == 'everyone'
+    assert layered.match('hello world!') == (11, 'hi')
+    assert layered.match('hey!') == (3, 'you')
+    assert layered.match('ho') == (1, 'H')
+    assert layered.match('hello world!', 0, 8) == (5, 'world')
+    assert layered.match('nothing') is None
+
+    lowest = LayeredTrie.from_tries([base, topic])
+    assert lowest['hey'] == 'there'
+    assert lowest['hello world'] == 'hi'
+
+    overlay = layered.overlay(page)
+    assert layered.overlay(page) is overlay
+    assert base.overlay(topic, page).match('hey') == (3, 'you')
+
+    # The last result is only kept while the layered tries are alive
+    document = Trie.from_dict({'hey': 'doc'}).compile()
+    result = weakref.ref(layered.overlay(document))
+    assert layered.overlay(document) is result()
+    del document
+    assert result() is None
+
+    assert not layered.multiline
+    assert base.overlay(Trie.from_dict({'a\nb': 'c'}).compile()).multiline
+
+
+def test_char_table():
+    base = Trie.from_dict({'a': 'A', 'ab': 'X', 'bc': 'Y', 'c': 'C'}).compile().overlay()
+    chars = base.char_table
+    assert chars.translation == {ord('a'): 'A', ord('c'): 'C'}
+    assert chars.candidates('abcabxbc', 0, 8, 8) == [0, 1, 3, 6]
+    assert chars.candidates('abcabxbc', 1, 4, 5) == [1, 3]
+    assert chars.candidates('abcabxbc', 0, 8, 7) == [0, 1, 3]
+
+    page = base.overlay(Trie.from_dict({'x': 'Z', 'cab': 'W'}).compile())
+    assert sorted(page.char_table.searched) == ['cab', 'x']
+    assert page.char_table.candidates('abcabxbc', 0, 8, 8) == [0, 1, 2, 3, 5, 6]
+
+    many = {f'x{i}': str(i) for i in range(100)} | {'c': 'D', 'zz': 'Z'}
+    topic = base.overlay(Trie.from_dict(many).compile())
+    assert topic.char_table.translation[ord('c')] == 'D'
+    assert topic.char_table.searched == (*(f'x{i}' for i in range(10)), 'zz')
+    assert topic.char_table.candidates('x10 zz', 0, 6, 6) == [0, 4]
+
+
+def test_rule_layer():
+    base = Trie.from_dict({'a': 'A', 'ab': 'X', 'bc': 'Y'}).compile().overlay()
+    rules = RuleLayer(base)
+    layered = base.with_rules(rules)
+    rules.update({'abc': 'Z', 'b': 'B'})
+    assert rules.lengths == {'a': (3, 2, 1), 'b': (2, 1)}
+    assert layered.match('abcd') == (3, 'Z')
+    assert layered.match('bd') == (1, 'B')
+    assert layered.char_table.candidates('xabcb', 0, 5, 5) == [1, 2, 4]
+
+    rules.remove_many(['abc', 'missing'])
+    assert rules.lengths == {'b': (2, 1)}
+    assert layered.match('abcd') == (2, 'X')
+    assert not layered.multiline
+    rules.update({'b': '', 'a\nb': 'c'})
+    assert rules.lengths == {'a': (3, 2, 1)}
+    assert layered.multiline
+
+    other = Trie.from_dict({'abcd': 'W'}).compile().overlay()
+    rules.rebase(other)
+    assert rules.lengths == {'a': (4, 3)}
+
+
+def test_char_table_numpy(monkeypatch: pytest.MonkeyPatch):
+    pytest.importorskip('numpy')
+    with open('tests/zh_cn.txt', encoding='utf-8') as f:
+        text = f.read() + '𠮷\ud800\U0010ffff'
+    for language in (zh_cn, zh_tw):
+        lc = LanguageConverter.from_language(language)
+        chars = lc.get_table().char_table
+        monkeypatch.setattr(trie_module, 'NUMPY_MIN_LENGTH', len(text) + 1)
+        expected = [chars.candidates(text, i, len(text) - i, len(text)) for i in range(0, 5000, 7)]
+        converted = lc.convert(text)
+        monkeypatch.setattr(trie_module, 'NUMPY_MIN_LENGTH', 0)
+        assert [chars.candidates(text, i, len(text) - i, len(text)) for i in range(0, 5000, 7)] == (
+            expected
+        )
+        assert lc.convert(text) == converted